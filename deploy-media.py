@@ -16,14 +16,39 @@ Usage:
   python3 deploy-media.py --apply   # apply changes
 """
 
+import mmap
 import os
+import re
 import sys
 import shutil
+from pathlib import Path
 
 BOT_DIR = os.path.expanduser("~/claude-telegram-bot")
 COMFYUI_DIR = os.path.expanduser("~/ComfyUI")
 DRY_RUN = "--apply" not in sys.argv
 
+# UNET variant follows ai-media.py: GGUF (models/unet) unless WAN22_USE_GGUF_UNET=0
+if os.environ.get("WAN22_USE_GGUF_UNET", "1") == "1":
+    _UNET = ("UNET (GGUF)", os.path.join(COMFYUI_DIR, "models", "unet",
+             os.environ.get("WAN22_GGUF_UNET_MODEL", "wan2.2-ti2v-5b-Q5_K_S.gguf")))
+else:
+    _UNET = ("UNET (fp16)", os.path.join(COMFYUI_DIR, "models", "diffusion_models",
+             os.environ.get("WAN22_MODEL", "wan2.2_ti2v_5B_fp16.safetensors")))
+
+MODEL_PATHS = {
+    _UNET[0]: _UNET[1],
+    "VAE": os.path.join(COMFYUI_DIR, "models", "vae", "wan2.2_vae.safetensors"),
+    "Text Encoder (GGUF)": os.path.join(COMFYUI_DIR, "models", "text_encoders", "umt5xxl-encoder-q5_k_s.gguf"),
+}
+
+# index.ts scan: import lines, runner start and the `<var> = new Bot(...)` assignment
+_INDEX_TS_PAT = re.compile(
+    rb"^[ \t]*(?P<imp>import\s)"
+    rb"|(?P<runner>createRunner|\brun\()"
+    rb"|\b(?P<bot_var>\w+)\s*=\s*new\s+(?:Bot|Grammy)\b",
+    re.MULTILINE,
+)
+
 def log(msg):
     prefix = "[DRY-RUN]" if DRY_RUN else "[APPLY]"
     print(f"  {prefix} {msg}")
@@ -36,7 +61,8 @@ def ensure_file(src, dst):
     if DRY_RUN:
         log(f"Would copy {src} -> {dst}")
         return True
-    shutil.copy2(src, dst)
+    # Metadata is not needed; copyfile uses the kernel fast path (sendfile)
+    shutil.copyfile(src, dst)
     log(f"Copied {src} -> {dst}")
     return True
 
@@ -46,15 +72,15 @@ def patch_file(filepath, marker, insert_text):
         print(f"  ERROR: File not found: {filepath}")
         return False
 
-    with open(filepath, "r") as f:
-        content = f.read()
+    content = Path(filepath).read_bytes()
 
-    # Already patched?
-    if "media-commands" in content:
+    # Already patched? (checked first so idempotent runs stop after one scan)
+    if content.find(b"media-commands") >= 0:
         log(f"Already patched: {filepath}")
         return True
 
-    if marker not in content:
+    marker_off = content.find(marker.encode("utf-8"))
+    if marker_off < 0:
         print(f"  WARNING: Marker not found in {filepath}: {marker!r}")
         print(f"  Manual patch required. Add these lines:")
         print(f'    import {{ registerMediaCommands }} from "./handlers/media-commands";')
@@ -65,9 +91,8 @@ def patch_file(filepath, marker, insert_text):
         log(f"Would patch {filepath} (insert before: {marker!r})")
         return True
 
-    new_content = content.replace(marker, insert_text + "\n" + marker)
-    with open(filepath, "w") as f:
-        f.write(new_content)
+    new_content = content[:marker_off] + insert_text.encode("utf-8") + b"\n" + content[marker_off:]
+    Path(filepath).write_bytes(new_content)
     log(f"Patched {filepath}")
     return True
 
@@ -92,6 +117,9 @@ python3 main.py --force-fp16 --use-split-cross-attention --listen "$@"
     return True
 
 def main():
+    # Block-buffer the progress output instead of one write per line;
+    # it is flushed automatically at exit.
+    sys.stdout.reconfigure(line_buffering=False)
     print("=" * 60)
     print("JARVIS Media Commands Deployment")
     print("=" * 60)
@@ -141,68 +169,55 @@ def main():
     # Strategy: find the import section and add import + registration
     # We look for "runner" or "bot.start" as a marker to insert before
     if os.path.exists(index_ts):
-        with open(index_ts, "r") as f:
-            index_content = f.read()
+        import_line = b'import { registerMediaCommands } from "./handlers/media-commands";'
+        bot_var_name = None
+        with open(index_ts, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            already_patched = mm.find(b"media-commands") >= 0
+            # Single pass: end of the last import line, bot variable name and
+            # the first runner line after the imports
+            import_end = -1
+            runner_off = -1
+            for m in _INDEX_TS_PAT.finditer(mm):
+                if m.group("imp"):
+                    eol = mm.find(b"\n", m.end())
+                    import_end = eol if eol >= 0 else len(mm)
+                    runner_off = -1
+                elif m.group("bot_var"):
+                    if bot_var_name is None:
+                        bot_var_name = m.group("bot_var").decode("utf-8")
+                elif runner_off < 0 and m.start() > import_end >= 0:
+                    runner_off = mm.rfind(b"\n", 0, m.start()) + 1
+            bot_var_name = bot_var_name or "bot"
+
+            register_line = f'registerMediaCommands({bot_var_name});'.encode("utf-8")
+            if not already_patched and import_end >= 0 and not DRY_RUN:
+                if runner_off >= 0:
+                    new_content = (mm[:import_end] + b"\n" + import_line + mm[import_end:runner_off]
+                                   + register_line + b"\n" + mm[runner_off:])
+                else:
+                    # Fallback: add right after import
+                    new_content = (mm[:import_end] + b"\n" + import_line + b"\n" + register_line
+                                   + mm[import_end:])
 
-        if "media-commands" in index_content:
+        if already_patched:
             log("Already patched: index.ts")
-        else:
-            # Find a good insertion point for the import
-            import_marker = None
-            register_marker = None
-
-            # Find last import line
-            lines = index_content.split("\n")
-            last_import_idx = -1
-            bot_var_name = "bot"
-            runner_line_idx = -1
-
-            for i, line in enumerate(lines):
-                if line.strip().startswith("import "):
-                    last_import_idx = i
-                if "createRunner" in line or "runner" in line.lower() and "=" in line:
-                    runner_line_idx = i
-                # Try to find the bot variable name
-                if "new Bot" in line or "new Grammy" in line:
-                    parts = line.split("=")[0].strip().split()
-                    if parts:
-                        bot_var_name = parts[-1]
-
-            if last_import_idx >= 0:
-                import_line = 'import { registerMediaCommands } from "./handlers/media-commands";'
-                register_line = f'registerMediaCommands({bot_var_name});'
-
-                if DRY_RUN:
-                    log(f"Would add import after line {last_import_idx + 1}")
-                    log(f"Would add registration: {register_line}")
-                    log(f"  Detected bot variable: {bot_var_name}")
-                    log(f"  NOTE: Verify bot variable name is correct!")
-                else:
-                    # Insert import after last import
-                    lines.insert(last_import_idx + 1, import_line)
-
-                    # Find where to add registration (after bot creation, before runner)
-                    # Re-scan since we inserted a line
-                    reg_inserted = False
-                    for i, line in enumerate(lines):
-                        if ("runner" in line.lower() and "=" in line) or "run(" in line:
-                            lines.insert(i, register_line)
-                            reg_inserted = True
-                            break
-
-                    if not reg_inserted:
-                        # Fallback: add right after import
-                        lines.insert(last_import_idx + 2, register_line)
-                        log("WARNING: Could not find runner line, added after imports")
-
-                    with open(index_ts, "w") as f:
-                        f.write("\n".join(lines))
-                    log("Patched index.ts")
+        elif import_end >= 0:
+            if DRY_RUN:
+                log(f"Would add import after byte offset {import_end}")
+                log(f"Would add registration: {register_line.decode('utf-8')}")
+                log(f"  Detected bot variable: {bot_var_name}")
+                log(f"  NOTE: Verify bot variable name is correct!")
             else:
-                print("  WARNING: No import statements found in index.ts")
-                print("  Manual patch required:")
-                print(f'    import {{ registerMediaCommands }} from "./handlers/media-commands";')
-                print(f"    registerMediaCommands(bot);")
+                with open(index_ts, "wb") as f:
+                    f.write(new_content)
+                if runner_off < 0:
+                    log("WARNING: Could not find runner line, added after imports")
+                log("Patched index.ts")
+        else:
+            print("  WARNING: No import statements found in index.ts")
+            print("  Manual patch required:")
+            print(f'    import {{ registerMediaCommands }} from "./handlers/media-commands";')
+            print(f"    registerMediaCommands(bot);")
     else:
         print(f"  ERROR: {index_ts} not found")
         ok = False
@@ -213,18 +228,14 @@ def main():
 
     # 5. Verify models
     print("\n[5/5] Verify ComfyUI models")
-    models = {
-        "UNET (fp16)": os.path.join(COMFYUI_DIR, "models", "diffusion_models", "wan2.2_ti2v_5B_fp16.safetensors"),
-        "VAE": os.path.join(COMFYUI_DIR, "models", "vae", "wan2.2_vae.safetensors"),
-        "Text Encoder (GGUF)": os.path.join(COMFYUI_DIR, "models", "text_encoders", "umt5xxl-encoder-q5_k_s.gguf"),
-    }
-    for name, path in models.items():
-        if os.path.exists(path):
-            size_mb = os.path.getsize(path) / (1024 * 1024)
-            log(f"OK: {name} ({size_mb:.0f} MB)")
-        else:
+    for name, path in MODEL_PATHS.items():
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
             print(f"  MISSING: {name} -> {path}")
             ok = False
+            continue
+        log(f"OK: {name} ({st.st_size / (1024 * 1024):.0f} MB)")
 
     # Summary
     print("\n" + "=" * 60)
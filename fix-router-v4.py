@@ -10,6 +10,9 @@ Smart Router Suggest - キーワードマッチ方式に変更
 """
 import sys
 
+# 進捗表示は1行ごとにwriteせず、まとめて書き出す（終了時に自動でflushされる）
+sys.stdout.reconfigure(line_buffering=False)
+
 TEXT_TS = "/Users/daijiromatsuokam1/claude-telegram-bot/src/handlers/text.ts"
 
 with open(TEXT_TS, "r") as f:
@@ -38,18 +41,16 @@ print(f"Replacing {end_idx - start_idx} lines...")
 # === Step 2: 新しいブロックで置換 ===
 new_block = [
     "    // 12.5. Smart Router - suggest council for strategic questions\n",
-    "    var _councilKeywords = /設計|design|アーキテクチャ|architecture|戦略|strategy|提案|proposal|方針|council/i;\n",
-    "    if (_councilKeywords.test(message) && !_lm.startsWith('council') && !_lm.startsWith('croppy:')) {\n",
+    "    if (_hasCouncilKw(message) && !_lm.startsWith('council') && !_lm.startsWith('croppy:')) {\n",
     "      var _ck = String(userId) + '_council';\n",
-    "      if (!_routerSuggestedCache.has(_ck)) {\n",
-    "        _routerSuggestedCache.add(_ck);\n",
+    "      if ((_routerSuggestedCache.get(_ck) ?? 0) <= Date.now()) {\n",
+    "        _routerSuggestedCache.set(_ck, Date.now() + 3600000);\n",
     "        try {\n",
     "          await ctx.reply('💡 戦略的な相談は council: で聞いてみて');\n",
     "          console.log('[Smart Router] council suggestion sent');\n",
     "        } catch (e) {\n",
     "          console.error('[Smart Router] send failed:', e);\n",
     "        }\n",
-    "        setTimeout(function() { _routerSuggestedCache.delete(_ck); }, 3600000);\n",
     "      }\n",
     "    }\n",
     "\n",
@@ -72,6 +73,46 @@ for i, line in enumerate(lines):
 
 lines = cleaned
 
+# === Step 3.5: キーワード判定をモジュールスコープに置く ===
+# (ハンドラ内に置くとメッセージごとに生成されるため。正規表現の代わりに
+#  小文字化した本文に対する固定キーワードの includes で判定する)
+COUNCIL_KEYWORDS_DECL = [
+    'const _COUNCIL_KW = new Set(["設計", "design", "アーキテクチャ", "architecture", "戦略", "strategy", "提案", "proposal", "方針", "council"]);\n',
+    "function _hasCouncilKw(m: string): boolean {\n",
+    "  const l = m.toLowerCase();\n",
+    "  for (const k of _COUNCIL_KW) { if (l.includes(k)) return true; }\n",
+    "  return false;\n",
+    "}\n",
+]
+# 旧版(Set + メッセージごとのsetTimeout)のキャッシュ宣言は Map + 1本の掃除タイマーに置き換える
+ROUTER_CACHE_DECL = [
+    "// key -> 有効期限(ms)。期限切れは1分ごとの1本のタイマーでまとめて掃除する\n",
+    "const _routerSuggestedCache = new Map<string, number>();\n",
+    "setInterval(() => {\n",
+    "  const now = Date.now();\n",
+    "  for (const [k, exp] of _routerSuggestedCache) if (exp <= now) _routerSuggestedCache.delete(k);\n",
+    "}, 60_000).unref();\n",
+]
+for i, line in enumerate(lines):
+    if line.startswith("const _routerSuggestedCache = new Set<string>()"):
+        lines[i:i + 1] = ROUTER_CACHE_DECL
+        print(f"Converted _routerSuggestedCache to Map + sweep interval (line {i + 1})")
+        break
+
+# 旧版(v4初版)で挿入した正規表現の宣言は置き換える
+lines = [line for line in lines if not line.startswith("const _councilKeywords")]
+if not any(line.startswith("const _COUNCIL_KW") for line in lines):
+    cache_idx = next((i for i, line in enumerate(lines)
+                      if line.startswith("const _routerSuggestedCache")), None)
+    if cache_idx is None:
+        print("❌ _routerSuggestedCache の宣言が見つかりません")
+        sys.exit(1)
+    # Map版は直後に掃除タイマーが続くので、その後ろに入れる
+    if lines[cache_idx + 1:cache_idx + 2] == ["setInterval(() => {\n"]:
+        cache_idx += len(ROUTER_CACHE_DECL) - 2
+    lines[cache_idx + 1:cache_idx + 1] = COUNCIL_KEYWORDS_DECL
+    print(f"Added _hasCouncilKw at module scope (line {cache_idx + 2})")
+
 # === Step 4: 書き込み ===
 with open(TEXT_TS, "w") as f:
     f.writelines(lines)
@@ -85,5 +126,5 @@ if removed:
 print("\nVerification:")
 with open(TEXT_TS) as f:
     for i, line in enumerate(f, 1):
-        if "Smart Router" in line or "councilKeywords" in line:
+        if "Smart Router" in line or "CouncilKw" in line or "COUNCIL_KW" in line:
             print(f"  {i}: {line.rstrip()}")
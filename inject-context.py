@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 """Inject JARVIS 47-command context into council.ts R1 and R2 prompts."""
 
+import mmap
+import os
 import sys
 
 FILEPATH = sys.argv[1] if len(sys.argv) > 1 else "src/handlers/council.ts"
@@ -20,38 +22,59 @@ JARVIS_CONTEXT = """
 
 """
 
-with open(FILEPATH, "r", encoding="utf-8") as f:
-    content = f.read()
+JARVIS_CONTEXT_B = JARVIS_CONTEXT.encode("utf-8")
 
-# --- R1: inject before テーマ: "{topic}" in R1_PROMPT_TEMPLATE ---
-R1_OLD = '''const R1_PROMPT_TEMPLATE = `
-テーマ: "{topic}"'''
+# --- R1/R2: inject before テーマ: "{topic}" in R1_PROMPT_TEMPLATE / R2_PROMPT_TEMPLATE ---
+TOPIC_LINE = 'テーマ: "{topic}"'.encode("utf-8")
+TEMPLATE_HEADS = [
+    ("R1_PROMPT_TEMPLATE", b"const R1_PROMPT_TEMPLATE = `\n"),
+    ("R2_PROMPT_TEMPLATE", b"const R2_PROMPT_TEMPLATE = `\n"),
+]
 
-R1_NEW = '''const R1_PROMPT_TEMPLATE = `
-''' + JARVIS_CONTEXT + '''テーマ: "{topic}"'''
 
-if R1_OLD not in content:
-    print("ERROR: R1_PROMPT_TEMPLATE not found")
-    sys.exit(1)
+def writev_all(fd, bufs):
+    """Write all buffers with one writev(), finishing any short write."""
+    written = os.writev(fd, bufs)
+    for buf in bufs:
+        if written >= len(buf):
+            written -= len(buf)
+            continue
+        rest = buf[written:]
+        while rest:
+            rest = rest[os.write(fd, rest):]
+        written = 0
 
-content = content.replace(R1_OLD, R1_NEW, 1)
-print("OK: R1_PROMPT_TEMPLATE patched")
 
-# --- R2: inject before テーマ: "{topic}" in R2_PROMPT_TEMPLATE ---
-R2_OLD = '''const R2_PROMPT_TEMPLATE = `
-テーマ: "{topic}"'''
+tmp_path = FILEPATH + ".tmp"
+with open(FILEPATH, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+    insert_at = []
+    for name, head in TEMPLATE_HEADS:
+        off = mm.find(head + TOPIC_LINE)
+        if off < 0:
+            print(f"ERROR: {name} not found")
+            sys.exit(1)
+        insert_at.append(off + len(head))
+        print(f"OK: {name} patched")
 
-R2_NEW = '''const R2_PROMPT_TEMPLATE = `
-''' + JARVIS_CONTEXT + '''テーマ: "{topic}"'''
+    # Gather the original slices around each insertion point straight from
+    # the mapping and push everything with one writev() into a temp file;
+    # the mapped file itself is replaced only after it is unmapped.
+    with memoryview(mm) as view:
+        bufs = []
+        prev = 0
+        for pos in sorted(insert_at):
+            bufs += [view[prev:pos], JARVIS_CONTEXT_B]
+            prev = pos
+        bufs.append(view[prev:])
 
-if R2_OLD not in content:
-    print("ERROR: R2_PROMPT_TEMPLATE not found")
-    sys.exit(1)
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.fchmod(fd, os.fstat(f.fileno()).st_mode & 0o777)
+            writev_all(fd, bufs)
+        finally:
+            os.close(fd)
+            del bufs
 
-content = content.replace(R2_OLD, R2_NEW, 1)
-print("OK: R2_PROMPT_TEMPLATE patched")
-
-with open(FILEPATH, "w", encoding="utf-8") as f:
-    f.write(content)
+os.replace(tmp_path, FILEPATH)
 
 print(f"DONE: {FILEPATH} updated")
@@ -6,40 +6,39 @@ Safe: uses string matching, not line numbers.
 
 import sys
 import os
+from pathlib import Path
 
 INDEX_PATH = os.path.expanduser("~/claude-telegram-bot/src/index.ts")
 
-# Read current file
-with open(INDEX_PATH, "r") as f:
-    content = f.read()
+# Read current file (bytes: the edits are plain ASCII, no decode/encode needed)
+content = Path(INDEX_PATH).read_bytes()
 
 # Check if already patched
-if "handleDebate" in content:
+if content.find(b"handleDebate") != -1:
     print("Already patched. Skipping.")
     sys.exit(0)
 
 # 1. Add import after meta-commands import
-IMPORT_ANCHOR = 'from "./handlers/meta-commands";'
-IMPORT_ADD = '''
+IMPORT_ANCHOR = b'from "./handlers/meta-commands";'
+IMPORT_ADD = b'''
 import {
   handleDebate,
   handleAskGPT,
   handleAskGemini,
 } from "./handlers/council";'''
 
-if IMPORT_ANCHOR not in content:
-    print("ERROR: Cannot find import anchor: " + IMPORT_ANCHOR)
+import_pos = content.find(IMPORT_ANCHOR)
+if import_pos == -1:
+    print("ERROR: Cannot find import anchor: " + IMPORT_ANCHOR.decode())
     sys.exit(1)
 
-content = content.replace(
-    IMPORT_ANCHOR,
-    IMPORT_ANCHOR + IMPORT_ADD
-)
+import_end = import_pos + len(IMPORT_ANCHOR)
+content = content[:import_end] + IMPORT_ADD + content[import_end:]
 
 # 2. Add commands after croppy command block
 # Find the croppy command block end and add after it
-CMD_ANCHOR = 'bot.on("message:text", handleText);'
-CMD_ADD = '''
+CMD_ANCHOR = b'bot.on("message:text", handleText);'
+CMD_ADD = b'''
 // Council Debate commands (3AI)
 bot.command("debate", handleDebate);
 bot.command("gpt", handleAskGPT);
@@ -47,18 +46,15 @@ bot.command("gem", handleAskGemini);
 
 '''
 
-if CMD_ANCHOR not in content:
-    print("ERROR: Cannot find command anchor: " + CMD_ANCHOR)
+cmd_pos = content.find(CMD_ANCHOR, import_end + len(IMPORT_ADD))
+if cmd_pos == -1:
+    print("ERROR: Cannot find command anchor: " + CMD_ANCHOR.decode())
     sys.exit(1)
 
-content = content.replace(
-    CMD_ANCHOR,
-    CMD_ADD + CMD_ANCHOR
-)
+content = content[:cmd_pos] + CMD_ADD + content[cmd_pos:]
 
 # Write patched file
-with open(INDEX_PATH, "w") as f:
-    f.write(content)
+Path(INDEX_PATH).write_bytes(content)
 
 print("Patched successfully!")
 print("  Added: import { handleDebate, handleAskGPT, handleAskGemini }")
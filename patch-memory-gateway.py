@@ -3,14 +3,20 @@
 Memory Gateway Worker patch
 - Add task_queue D1 table
 - Add /v1/exec/submit, /v1/exec/poll, /v1/exec/complete, /v1/exec/result endpoints
+- Handler source is exec-handlers.ts.tmpl, which must sit next to this script
 """
 
+import mmap
 import os
+from pathlib import Path
 
 GATEWAY_DIR = os.path.expanduser("~/memory-gateway")
 INDEX_FILE = os.path.join(GATEWAY_DIR, "src", "index-v1.ts")
 EXEC_HANDLER_FILE = os.path.join(GATEWAY_DIR, "src", "exec-handlers.ts")
 MIGRATION_FILE = os.path.join(GATEWAY_DIR, "migrations", "0002_task_queue.sql")
+MIGRATION_0003_FILE = os.path.join(GATEWAY_DIR, "migrations", "0003_task_queue_v2.sql")
+MIGRATION_0004_FILE = os.path.join(GATEWAY_DIR, "migrations", "0004_task_queue_target.sql")
+EXEC_HANDLER_TEMPLATE = Path(__file__).with_name("exec-handlers.ts.tmpl")
 
 # ========== 1. D1 Migration ==========
 os.makedirs(os.path.join(GATEWAY_DIR, "migrations"), exist_ok=True)
@@ -34,219 +40,82 @@ CREATE INDEX IF NOT EXISTS idx_task_queue_status ON task_queue(status);
 CREATE INDEX IF NOT EXISTS idx_task_queue_created ON task_queue(created_at);
 """
 
-with open(MIGRATION_FILE, "w") as f:
-    f.write(migration_sql)
-print(f"[OK] Migration: {MIGRATION_FILE}")
+# 0002 is already applied on existing databases, so schema changes go in 0003:
+# rebuild task_queue with epoch-ms timestamps and move output into task_results
+migration_0003_sql = """-- task_queue v2: INTEGER epoch-ms timestamps, output in task_results
+-- Move the old table aside first: nothing references it, so it can be dropped
+-- after the copy without tripping task_results' foreign key
+ALTER TABLE task_queue RENAME TO task_queue_old;
 
-# ========== 2. exec-handlers.ts ==========
-exec_handlers = r"""/**
- * Remote Execution Handlers
- * Croppy submits commands -> Jarvis polls & executes -> results returned
- */
-
-import { successResponse, errorResponse } from './utils';
-
-interface StorageEnv {
-  DB: any;
-}
-
-function generateId(): string {
-  return 'task_' + Date.now().toString(36) + '_' + Math.random().toString(36).substring(2, 8);
-}
-
-/**
- * POST /v1/exec/submit - Submit a command for execution
- * Body: { command: string, cwd?: string, timeout_seconds?: number, source?: string }
- */
-export async function handleExecSubmit(request: Request, env: StorageEnv): Promise<Response> {
-  try {
-    const body: any = await request.json();
-    const { command, cwd, timeout_seconds, source } = body;
-
-    if (!command) {
-      return errorResponse('Missing command', 'INVALID_REQUEST', 400);
-    }
+CREATE TABLE task_queue (
+  id TEXT PRIMARY KEY,
+  created_at INTEGER NOT NULL DEFAULT (unixepoch() * 1000),  -- epoch ms
+  updated_at INTEGER,
+  status TEXT NOT NULL DEFAULT 'pending',
+  command TEXT NOT NULL,
+  cwd TEXT DEFAULT '~',
+  timeout_seconds INTEGER DEFAULT 300,
+  result_exit_code INTEGER,
+  source TEXT NOT NULL DEFAULT 'croppy'
+);
 
-    const id = generateId();
-    const now = new Date().toISOString();
-
-    await env.DB.prepare(
-      `INSERT INTO task_queue (id, created_at, status, command, cwd, timeout_seconds, source)
-       VALUES (?, ?, 'pending', ?, ?, ?, ?)`
-    ).bind(
-      id,
-      now,
-      command,
-      cwd || '~',
-      timeout_seconds || 300,
-      source || 'croppy'
-    ).run();
-
-    return successResponse({ ok: true, task_id: id });
-  } catch (error) {
-    const msg = error instanceof Error ? error.message : String(error);
-    return errorResponse('Submit failed: ' + msg, 'SUBMIT_ERROR', 500);
-  }
-}
-
-/**
- * GET /v1/exec/poll - Jarvis polls for pending tasks
- * Returns oldest pending task and marks it as 'running'
- */
-export async function handleExecPoll(env: StorageEnv): Promise<Response> {
-  try {
-    // Get oldest pending task
-    const result = await env.DB.prepare(
-      `SELECT id, command, cwd, timeout_seconds, source, created_at
-       FROM task_queue
-       WHERE status = 'pending'
-       ORDER BY created_at ASC
-       LIMIT 1`
-    ).first();
-
-    if (!result) {
-      return successResponse({ ok: true, task: null });
-    }
+-- datetime('now') / ISO 8601 strings -> epoch ms (julianday keeps milliseconds)
+INSERT INTO task_queue (id, created_at, updated_at, status, command, cwd, timeout_seconds, result_exit_code, source)
+SELECT id,
+  COALESCE(CAST(round((julianday(created_at) - 2440587.5) * 86400000) AS INTEGER), unixepoch() * 1000),
+  CAST(round((julianday(updated_at) - 2440587.5) * 86400000) AS INTEGER),
+  status, command, cwd, timeout_seconds, result_exit_code, source
+FROM task_queue_old;
+
+-- Output (up to 200KB per task) lives in its own table so the task_queue rows
+-- scanned by poll/run stay small; only /v1/exec/result and exec/run read it
+CREATE TABLE IF NOT EXISTS task_results (
+  task_id TEXT PRIMARY KEY REFERENCES task_queue(id),
+  stdout TEXT,
+  stderr TEXT
+);
 
-    // Mark as running
-    await env.DB.prepare(
-      `UPDATE task_queue SET status = 'running', updated_at = ? WHERE id = ?`
-    ).bind(new Date().toISOString(), result.id).run();
-
-    return successResponse({ ok: true, task: result });
-  } catch (error) {
-    const msg = error instanceof Error ? error.message : String(error);
-    return errorResponse('Poll failed: ' + msg, 'POLL_ERROR', 500);
-  }
-}
-
-/**
- * POST /v1/exec/complete - Jarvis reports task completion
- * Body: { task_id: string, exit_code: number, stdout: string, stderr: string }
- */
-export async function handleExecComplete(request: Request, env: StorageEnv): Promise<Response> {
-  try {
-    const body: any = await request.json();
-    const { task_id, exit_code, stdout, stderr } = body;
-
-    if (!task_id) {
-      return errorResponse('Missing task_id', 'INVALID_REQUEST', 400);
-    }
+INSERT OR REPLACE INTO task_results (task_id, stdout, stderr)
+SELECT id, result_stdout, result_stderr FROM task_queue_old
+WHERE result_stdout IS NOT NULL OR result_stderr IS NOT NULL;
 
-    await env.DB.prepare(
-      `UPDATE task_queue
-       SET status = 'done',
-           result_exit_code = ?,
-           result_stdout = ?,
-           result_stderr = ?,
-           updated_at = ?
-       WHERE id = ?`
-    ).bind(
-      exit_code ?? -1,
-      (stdout || '').substring(0, 100000),
-      (stderr || '').substring(0, 100000),
-      new Date().toISOString(),
-      task_id
-    ).run();
-
-    return successResponse({ ok: true });
-  } catch (error) {
-    const msg = error instanceof Error ? error.message : String(error);
-    return errorResponse('Complete failed: ' + msg, 'COMPLETE_ERROR', 500);
-  }
-}
-
-/**
- * GET /v1/exec/result/:task_id - Get task result
- */
-export async function handleExecResult(taskId: string, env: StorageEnv): Promise<Response> {
-  try {
-    const result = await env.DB.prepare(
-      `SELECT id, status, command, cwd, result_stdout, result_stderr, result_exit_code, created_at, updated_at
-       FROM task_queue
-       WHERE id = ?`
-    ).bind(taskId).first();
-
-    if (!result) {
-      return errorResponse('Task not found', 'NOT_FOUND', 404);
-    }
+-- Also drops idx_task_queue_status/created, which moved with the rename
+DROP TABLE task_queue_old;
 
-    return successResponse({ ok: true, task: result });
-  } catch (error) {
-    const msg = error instanceof Error ? error.message : String(error);
-    return errorResponse('Result fetch failed: ' + msg, 'RESULT_ERROR', 500);
-  }
-}
-
-/**
- * POST /v1/exec/run - Synchronous execution (submit + wait for result)
- * Body: { command: string, cwd?: string, timeout_seconds?: number }
- * Polls every 2 seconds until done or timeout (max 25 seconds for CF Worker limit)
- */
-export async function handleExecRun(request: Request, env: StorageEnv): Promise<Response> {
-  try {
-    const body: any = await request.json();
-    const { command, cwd, timeout_seconds } = body;
-
-    if (!command) {
-      return errorResponse('Missing command', 'INVALID_REQUEST', 400);
-    }
+CREATE INDEX idx_task_queue_created ON task_queue(created_at);
 
-    // Submit task
-    const id = generateId();
-    const now = new Date().toISOString();
-
-    await env.DB.prepare(
-      `INSERT INTO task_queue (id, created_at, status, command, cwd, timeout_seconds, source)
-       VALUES (?, ?, 'pending', ?, ?, ?, 'croppy')`
-    ).bind(id, now, command, cwd || '~', timeout_seconds || 300).run();
-
-    // Poll for result (max 25 seconds - CF Worker CPU time limit)
-    const maxWait = 25000;
-    const pollInterval = 2000;
-    const startTime = Date.now();
-
-    while (Date.now() - startTime < maxWait) {
-      await new Promise(resolve => setTimeout(resolve, pollInterval));
-
-      const result = await env.DB.prepare(
-        `SELECT status, result_stdout, result_stderr, result_exit_code
-         FROM task_queue WHERE id = ?`
-      ).bind(id).first();
-
-      if (result && result.status === 'done') {
-        return successResponse({
-          ok: true,
-          task_id: id,
-          exit_code: result.result_exit_code,
-          stdout: result.result_stdout,
-          stderr: result.result_stderr,
-        });
-      }
-    }
+-- Poll: WHERE status = 'pending' ORDER BY created_at LIMIT 1 -> index range scan, no sort
+-- (partial: only pending rows are indexed, so it stays small as done tasks pile up)
+CREATE INDEX idx_task_queue_pending ON task_queue(status, created_at) WHERE status = 'pending';
+"""
 
-    // Timeout - return task_id for manual polling
-    return successResponse({
-      ok: true,
-      task_id: id,
-      status: 'timeout',
-      message: 'Task still running. Poll /v1/exec/result/' + id,
-    });
-  } catch (error) {
-    const msg = error instanceof Error ? error.message : String(error);
-    return errorResponse('Run failed: ' + msg, 'RUN_ERROR', 500);
-  }
-}
+# Tasks are routed to a named poller (task-poller.ts POLL_TARGET, ai-image.py serve)
+migration_0004_sql = """-- task_queue.target: which poller may claim the task ('m3' = default shell poller)
+ALTER TABLE task_queue ADD COLUMN target TEXT NOT NULL DEFAULT 'm3';
+
+-- Poll: WHERE status = 'pending' AND target = ? ORDER BY created_at LIMIT 1
+DROP INDEX IF EXISTS idx_task_queue_pending;
+CREATE INDEX idx_task_queue_pending ON task_queue(target, created_at) WHERE status = 'pending';
 """
 
-with open(EXEC_HANDLER_FILE, "w") as f:
-    f.write(exec_handlers)
+with open(MIGRATION_FILE, "w") as f:
+    f.write(migration_sql)
+print(f"[OK] Migration: {MIGRATION_FILE}")
+
+with open(MIGRATION_0003_FILE, "w") as f:
+    f.write(migration_0003_sql)
+print(f"[OK] Migration: {MIGRATION_0003_FILE}")
+
+with open(MIGRATION_0004_FILE, "w") as f:
+    f.write(migration_0004_sql)
+print(f"[OK] Migration: {MIGRATION_0004_FILE}")
+
+# ========== 2. exec-handlers.ts ==========
+# The handler source lives next to this script; copy it verbatim
+Path(EXEC_HANDLER_FILE).write_bytes(EXEC_HANDLER_TEMPLATE.read_bytes())
 print(f"[OK] Exec handlers: {EXEC_HANDLER_FILE}")
 
 # ========== 3. Patch index-v1.ts ==========
-with open(INDEX_FILE, "r") as f:
-    content = f.read()
-
 # Add import
 import_line = "import { runJanitor } from './janitor';"
 new_import = """import { runJanitor } from './janitor';
@@ -258,12 +127,6 @@ import {
   handleExecRun,
 } from './exec-handlers';"""
 
-if "exec-handlers" not in content:
-    content = content.replace(import_line, new_import)
-    print("[OK] Added exec-handlers import")
-else:
-    print("[SKIP] exec-handlers import already exists")
-
 # Add routes before 404
 route_marker = "// ==================== 404 Not Found ===================="
 exec_routes = """// ==================== Remote Execution API ====================
@@ -275,7 +138,7 @@ exec_routes = """// ==================== Remote Execution API ==================
 
     // GET /v1/exec/poll - Jarvis polls for pending tasks
     if (pathname === '/v1/exec/poll' && request.method === 'GET') {
-      return handleExecPoll(env);
+      return handleExecPoll(request, env);
     }
 
     // POST /v1/exec/complete - Jarvis reports completion
@@ -296,18 +159,45 @@ exec_routes = """// ==================== Remote Execution API ==================
 
     // ==================== 404 Not Found ===================="""
 
-if "/v1/exec/submit" not in content:
-    content = content.replace(route_marker, exec_routes)
-    print("[OK] Added exec routes")
-else:
-    print("[SKIP] exec routes already exist")
-
-with open(INDEX_FILE, "w") as f:
-    f.write(content)
-print(f"[OK] Patched: {INDEX_FILE}")
+# Locate both anchors on the mapped file, then write prefix/new/suffix slices once
+with open(INDEX_FILE, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+    splices = []  # (offset, length of replaced anchor, replacement)
+    if mm.find(b"exec-handlers") < 0:
+        off = mm.find(import_line.encode())
+        if off >= 0:
+            splices.append((off, len(import_line), new_import.encode()))
+            print("[OK] Added exec-handlers import")
+        else:
+            print(f"[WARN] Import anchor not found: {import_line}")
+    else:
+        print("[SKIP] exec-handlers import already exists")
+
+    if mm.find(b"/v1/exec/submit") < 0:
+        off = mm.find(route_marker.encode())
+        if off >= 0:
+            splices.append((off, len(route_marker), exec_routes.encode()))
+            print("[OK] Added exec routes")
+        else:
+            print(f"[WARN] Route marker not found: {route_marker}")
+    else:
+        print("[SKIP] exec routes already exist")
+
+    parts = []
+    pos = 0
+    for off, length, replacement in sorted(splices):
+        parts += [mm[pos:off], replacement]
+        pos = off + length
+    parts.append(mm[pos:])
+
+if splices:
+    with open(INDEX_FILE, "wb") as f:
+        f.writelines(parts)
+    print(f"[OK] Patched: {INDEX_FILE}")
 
 print("\n=== DONE ===")
 print("Next steps:")
 print("1. cd ~/memory-gateway")
-print("2. wrangler d1 execute memory_gateway --remote --file=migrations/0002_task_queue.sql")
-print("3. wrangler deploy")
+print("2. wrangler d1 execute memory_gateway --remote --file=migrations/0002_task_queue.sql  (skip if already applied)")
+print("3. wrangler d1 execute memory_gateway --remote --file=migrations/0003_task_queue_v2.sql  (once)")
+print("4. wrangler d1 execute memory_gateway --remote --file=migrations/0004_task_queue_target.sql  (once)")
+print("5. wrangler deploy")
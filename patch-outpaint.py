@@ -1,37 +1,39 @@
 #!/usr/bin/env python3
 """Patch ai-media.py: outpaint params (cfg/denoise/lora) - outpaint workflow only"""
 
+import re
+
 FILE = '/Users/daijiromatsuokam1/claude-telegram-bot/scripts/ai-media.py'
 
+# old -> (new, trailing comment, log note); one compiled pass over the function body
+REPLACEMENTS = {
+    '"cfg": 3.5': ('"cfg": 4.5', None, "cfg 3.5 -> 4.5"),
+    '"denoise": denoise': ('"denoise": 0.85', "# outpaint fixed", "denoise -> 0.85"),
+    '"strength_model": lora_strength': ('"strength_model": 0.3', "# outpaint: reduce LoRA", "lora_strength -> 0.3"),
+}
+PATTERN = re.compile(r'(?P<old>' + '|'.join(re.escape(k) for k in REPLACEMENTS) + r')(?P<rest>.*)$',
+                     re.MULTILINE)
+
 with open(FILE, 'r') as f:
-    lines = f.readlines()
-
-changes = 0
-in_outpaint = False
-
-for i, line in enumerate(lines):
-    if 'def build_flux_outpaint_workflow' in line:
-        in_outpaint = True
-    elif in_outpaint and line.startswith('def '):
-        in_outpaint = False
-
-    if in_outpaint:
-        if '"cfg": 3.5' in line:
-            lines[i] = line.replace('"cfg": 3.5', '"cfg": 4.5')
-            changes += 1
-            print(f"L{i+1}: cfg 3.5 -> 4.5")
-        if '"denoise": denoise' in line:
-            lines[i] = line.replace('"denoise": denoise', '"denoise": 0.85  # outpaint fixed')
-            changes += 1
-            print(f"L{i+1}: denoise -> 0.85")
-        if '"strength_model": lora_strength' in line:
-            lines[i] = line.replace('"strength_model": lora_strength', '"strength_model": 0.3  # outpaint: reduce LoRA')
-            changes += 1
-            print(f"L{i+1}: lora_strength -> 0.3")
+    src = f.read()
+
+start = src.index('def build_flux_outpaint_workflow')
+end = src.find('\ndef ', start)
+end = len(src) if end < 0 else end + 1
+block = src[start:end]
+
+def _sub(m):
+    new, comment, note = REPLACEMENTS[m.group('old')]
+    line_no = src.count('\n', 0, start + m.start()) + 1
+    print(f"L{line_no}: {note}")
+    # comment goes after the rest of the line so a trailing comma stays code
+    return new + m.group('rest') + (f"  {comment}" if comment else '')
+
+new_block, changes = PATTERN.subn(_sub, block)
 
 if changes == 3:
     with open(FILE, 'w') as f:
-        f.writelines(lines)
+        f.write(src[:start] + new_block + src[end:])
     print(f"\n✅ {changes} changes applied")
 else:
     print(f"\n❌ Expected 3 changes, found {changes}. NOT modified.")
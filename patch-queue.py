@@ -2,6 +2,7 @@
 """Patch media-commands.ts: add withMediaQueue wrapper around all runAiMedia calls"""
 
 import os
+import re
 
 REPO = os.path.expanduser("~/claude-telegram-bot")
 PATH = os.path.join(REPO, "src/handlers/media-commands.ts")
@@ -18,19 +19,34 @@ for i, line in enumerate(lines):
 
 QUEUE_FN = [
     '',
-    '// Media queue: serialize heavy AI tasks to prevent SIGTERM under memory pressure',
-    'let mediaQueueBusy = false;',
-    'const mediaQueueWaiting: Array<{ run: () => Promise<any>; resolve: (v: any) => void; reject: (e: any) => void }> = [];',
+    '// Media queue: at most MEDIA_CONCURRENCY heavy AI tasks at once.',
+    '// Default 1 serializes them to prevent SIGTERM under memory pressure; raise on bigger hosts.',
+    'const MEDIA_CONCURRENCY = Math.max(1, Number(process.env.MEDIA_CONCURRENCY) || 1);',
+    '// Retries are opt-in (MEDIA_RETRIES, default 0) and only for errors that can succeed',
+    '// on a second try (resource exhaustion at spawn); a failed generation is never re-run.',
+    'const MEDIA_RETRIES = Math.max(0, Number(process.env.MEDIA_RETRIES) || 0);',
+    "const MEDIA_TRANSIENT_CODES = new Set(['EAGAIN', 'ENOMEM', 'EMFILE', 'ENFILE', 'EBUSY']);",
+    'function isTransientMediaError(e: unknown): boolean {',
+    "  return MEDIA_TRANSIENT_CODES.has((e as NodeJS.ErrnoException)?.code ?? '');",
+    '}',
+    'let mediaActive = 0;',
+    'const mediaQueueWaiting: Array<() => void> = [];',
+    'async function acquireMediaSlot(): Promise<void> {',
+    '  if (mediaActive < MEDIA_CONCURRENCY) { mediaActive++; return; }',
+    '  await new Promise<void>((resolve) => { mediaQueueWaiting.push(resolve); }); // slot handed over by releaseMediaSlot',
+    '}',
+    'function releaseMediaSlot(): void {',
+    '  const next = mediaQueueWaiting.shift();',
+    '  if (next) next(); else mediaActive--;',
+    '}',
     'async function withMediaQueue<T>(fn: () => Promise<T>): Promise<T> {',
-    '  if (mediaQueueBusy) {',
-    '    return new Promise<T>((resolve, reject) => { mediaQueueWaiting.push({ run: fn, resolve, reject }); });',
-    '  }',
-    '  mediaQueueBusy = true;',
-    '  try { return await fn(); }',
-    '  finally {',
-    '    const next = mediaQueueWaiting.shift();',
-    '    if (next) { next.run().then(next.resolve, next.reject).finally(() => { mediaQueueBusy = false; }); }',
-    '    else { mediaQueueBusy = false; }',
+    '  for (let attempt = 0; ; attempt++) {',
+    '    await acquireMediaSlot();',
+    '    try { return await fn(); }',
+    '    catch (e) { if (attempt >= MEDIA_RETRIES || !isTransientMediaError(e)) throw e; }',
+    '    finally { releaseMediaSlot(); }',
+    '    // Retry outside the slot with jittered exponential backoff (no thundering herd)',
+    '    await new Promise((r) => setTimeout(r, 1000 * 2 ** attempt * (0.5 + Math.random())));',
     '  }',
     '}',
 ]
@@ -41,37 +57,31 @@ for idx, qline in enumerate(QUEUE_FN):
 content = '\n'.join(lines)
 
 # Step 2: Wrap each "await runAiMedia(" with "await withMediaQueue(() => runAiMedia("
-# Strategy: find "await runAiMedia(" then track parens to find the matching ")"
-NEEDLE = 'await runAiMedia('
+# Strategy: regex-locate each "await runAiMedia(", then jump paren to paren to the
+# matching ")" and copy whole slices (no per-character walk)
+NEEDLE_RE = re.compile(r'await runAiMedia\(')
+PAREN_RE = re.compile(r'[()]')
 count = 0
 result = []
-i = 0
-n = len(content)
+last = 0
 
-while i < n:
-    if content[i:i+len(NEEDLE)] == NEEDLE:
-        # Found "await runAiMedia("
-        paren_pos = i + len(NEEDLE) - 1  # position of the opening (
-        depth = 1
-        j = paren_pos + 1
-        while j < n and depth > 0:
-            if content[j] == '(':
-                depth += 1
-            elif content[j] == ')':
-                depth -= 1
-            j += 1
-        # j is now right after the closing )
-        # content[paren_pos+1 : j-1] is the inner content
-        inner = content[paren_pos+1 : j-1]
-        result.append('await withMediaQueue(() => runAiMedia(')
-        result.append(inner)
-        result.append('))')
-        i = j
-        count += 1
-    else:
-        result.append(content[i])
-        i += 1
+for m in NEEDLE_RE.finditer(content):
+    if m.start() < last:
+        continue  # nested inside a call that was already wrapped
+    depth = 1
+    close = len(content)
+    for p in PAREN_RE.finditer(content, m.end()):
+        depth += 1 if p.group() == '(' else -1
+        if depth == 0:
+            close = p.start()
+            break
+    # content[m.end():close] is the inner argument list
+    result += [content[last:m.start()], 'await withMediaQueue(() => runAiMedia(',
+               content[m.end():close], '))']
+    last = close + 1
+    count += 1
 
+result.append(content[last:])
 content = ''.join(result)
 
 with open(PATH, 'w') as f:
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""patches.pyz のエントリポイント
+
+Usage:
+  python3 patches.pyz <script> [args...]
+  例) python3 patches.pyz apply-patches-v3
+      python3 patches.pyz inject-context src/handlers/council.ts
+
+<script> はルート直下のパッチスクリプト名（.py なし）。
+"""
+import runpy
+import sys
+
+SCRIPTS = (
+    "apply-patches",
+    "apply-patches-v2",
+    "apply-patches-v3",
+    "fix-router-v4",
+    "deploy-media",
+    "patch-index",
+    "inject-context",
+)
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in SCRIPTS:
+        print(__doc__.strip())
+        print("\nScripts: " + ", ".join(SCRIPTS))
+        sys.exit(2)
+    name = sys.argv[1]
+    # 各スクリプトは sys.argv[1:] を自分の引数として読むので1つずらす
+    sys.argv = [name + ".py"] + sys.argv[2:]
+    runpy.run_module(name, run_name="__main__", alter_sys=True)
+
+if __name__ == "__main__":
+    main()
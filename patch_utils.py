@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""apply-patches*.py 共通のパッチ適用ヘルパー
+
+各スクリプトは {パス: [(old, new, label), ...]} を組み立てて run() を呼ぶだけにする。
+`--jobs N` で別ファイルへのパッチをスレッド並行で適用できる。
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# path -> [st_mtime_ns, content(bytes), dirty]
+_FILE_CACHE = {}
+
+def load(path):
+    """ファイル内容を返す（未変更・mtime一致ならキャッシュを再利用）"""
+    entry = _FILE_CACHE.get(path)
+    if entry is not None and (entry[2] or entry[0] == os.stat(path).st_mtime_ns):
+        return entry[1]
+    mtime = os.stat(path).st_mtime_ns
+    content = Path(path).read_bytes()
+    _FILE_CACHE[path] = [mtime, content, False]
+    return content
+
+def store(path, content):
+    """キャッシュ上の内容を更新する（書き込みはflush()でまとめて行う）"""
+    entry = _FILE_CACHE[path]
+    entry[1] = content
+    entry[2] = True
+
+def flush(paths=None):
+    """変更のあったファイルだけを1回ずつ書き戻す（pathsで対象を絞れる）"""
+    for path, entry in list(_FILE_CACHE.items()):
+        if not entry[2] or (paths is not None and path not in paths):
+            continue
+        Path(path).write_bytes(entry[1])
+        entry[0] = os.stat(path).st_mtime_ns
+        entry[2] = False
+
+def _scan(content, needles):
+    """置換対象ごとに独立して出現位置を求め、{needle: [offset, ...]} を返す
+
+    対象同士が入れ子・重複していても互いに影響しない。判定には
+    「0件/1件/複数」が分かれば十分なので、位置は最大2件までしか探さない。
+    """
+    hits = {}
+    for n in needles:
+        first = content.find(n)
+        if first < 0:
+            hits[n] = []
+        else:
+            second = content.find(n, first + 1)
+            hits[n] = [first] if second < 0 else [first, second]
+    return hits
+
+def apply_batch(path, patches):
+    """同一ファイルへのパッチをまとめて適用し、エラーメッセージのリストを返す
+
+    まず各置換対象の出現位置を求め、すべてがちょうど1箇所ずつ見つかり、
+    かつ置換範囲が互いに重ならない場合だけ、その位置を使ってスライスを連結し
+    新しい内容を組み立てる。1つでも不一致があればそのファイルは一切変更しない。
+    書き戻しはflush()で1回。
+    """
+    errors = []
+    content = load(path)
+    needles = [old.encode("utf-8") for old, _, _ in patches]
+    hits = _scan(content, needles)
+
+    for old_b, (_, _, label) in zip(needles, patches):
+        count = len(hits[old_b])
+        if count == 0:
+            errors.append(f"❌ {label}: 置換対象が見つかりません")
+        elif count > 1:
+            # _scanは2件で打ち切るので、メッセージ用に実際の件数を数え直す
+            errors.append(f"❌ {label}: 置換対象が複数あります（{content.count(old_b)}箇所）")
+    if errors:
+        errors.append(f"❌ {path}: 事前チェックに失敗したため変更していません")
+        return errors
+
+    edits = sorted((hits[old_b][0], old_b, new.encode("utf-8"), label)
+                   for old_b, (_, new, label) in zip(needles, patches))
+    # 置換範囲が重なると連結結果が壊れるので、重なりがあればファイルごと中止する
+    for (start, old_b, _, label), (next_start, _, _, next_label) in zip(edits, edits[1:]):
+        if next_start < start + len(old_b):
+            errors.append(f"❌ {label} / {next_label}: 置換範囲が重なっています")
+    if errors:
+        errors.append(f"❌ {path}: 事前チェックに失敗したため変更していません")
+        return errors
+
+    parts = []
+    pos = 0
+    for start, old_b, new_b, _ in edits:
+        parts.append(content[pos:start])
+        parts.append(new_b)
+        pos = start + len(old_b)
+    parts.append(content[pos:])
+    store(path, b"".join(parts))
+    for _, _, label in patches:
+        print(f"✅ {label}")
+    return errors
+
+def _apply_and_flush(path, patches):
+    errors = apply_batch(path, patches)
+    flush([path])
+    return errors
+
+def _jobs_from_argv(argv):
+    """--jobs N（-j N）を読む。指定なしは1（逐次）。値の欠落・不正は使い方を表示して終了"""
+    parser = argparse.ArgumentParser(description="パッチを適用する")
+    parser.add_argument("-j", "--jobs", type=int, default=1, metavar="N",
+                        help="別ファイルへのパッチを並行適用するスレッド数（既定: 1）")
+    return max(1, parser.parse_args(argv).jobs)
+
+def run(patches_by_path, done_message):
+    """全ファイルにパッチを適用して結果を表示し、終了コードで抜ける
+
+    --jobs N を付けると、ファイルごとの読み込み→置換→書き戻しを
+    N本のスレッドで並行に行う（1ファイルは必ず1スレッドだけが触る）。
+    """
+    jobs = min(_jobs_from_argv(sys.argv[1:]), len(patches_by_path)) or 1
+    errors = []
+    if jobs > 1:
+        with ThreadPoolExecutor(max_workers=jobs) as ex:
+            for errs in ex.map(lambda kv: _apply_and_flush(*kv), patches_by_path.items()):
+                errors += errs
+    else:
+        for path, patches in patches_by_path.items():
+            errors += apply_batch(path, patches)
+        flush()
+
+    print("\n" + "=" * 40)
+    if errors:
+        print(f"⚠️ {len(errors)}件のエラー:")
+        for e in errors:
+            print(f"  {e}")
+        sys.exit(1)
+    else:
+        print(done_message)
+        sys.exit(0)
@@ -2,6 +2,12 @@
 """
 AI Image Generation Wrapper
 Handles: text-to-image (mflux/FLUX) + segment-edit (CLIPSeg + SDXL inpaint)
+
+Modes:
+  generate / segment-edit   one-shot CLI (models load per process)
+  serve                     long-running worker: claims tasks submitted with
+                            target "ai-image" (/v1/exec/poll?target=ai-image)
+                            and keeps CLIPSeg + SDXL loaded across tasks
 """
 
 import sys
@@ -9,18 +15,38 @@ import json
 import subprocess
 import os
 import time
+import functools
+import urllib.request
 try:
     from pillow_heif import register_heif_opener
     register_heif_opener()
 except ImportError:
     pass
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB
+    _TURBOJPEG = TurboJPEG()
+except (ImportError, OSError):  # OSError: libturbojpeg not found
+    _TURBOJPEG = None
 
 MODEL_DIR = os.path.expanduser("~/ai-models")
 OUTPUT_DIR = "/tmp/ai-images"
+GATEWAY_URL = os.environ.get("MEMORY_GATEWAY_URL", "https://jarvis-memory-gateway.jarvis-matsuoka.workers.dev")
+SERVE_TARGET = os.environ.get("AI_IMAGE_POLL_TARGET", "ai-image")
+SERVE_POLL_INTERVAL = 5
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 
+def _save_jpeg(rgb, path, quality=92):
+    """Encode an RGB uint8 array straight to JPEG (libjpeg-turbo, PIL fallback)"""
+    if _TURBOJPEG is not None:
+        with open(path, "wb") as f:
+            f.write(_TURBOJPEG.encode(rgb, quality=quality, pixel_format=TJPF_RGB))
+    else:
+        from PIL import Image
+        Image.fromarray(rgb).save(path, "JPEG", quality=quality)
+
+
 def generate_image(prompt, model="schnell", steps=4, width=1024, height=1024, quantize=8):
     """Text-to-image with mflux/FLUX"""
     output = os.path.join(OUTPUT_DIR, f"gen_{int(time.time())}.png")
@@ -48,27 +74,83 @@ def generate_image(prompt, model="schnell", steps=4, width=1024, height=1024, qu
     if result.returncode != 0:
         return {"error": result.stderr}
     
-    # Convert PNG to JPEG for smaller file size
+    # Convert PNG to JPEG for smaller file size (mflux-generate only writes files)
+    # Best effort: on failure the PNG is still a valid result
     try:
+        import numpy as np
         from PIL import Image as PILImg
         jpg_output = output.replace(".png", ".jpg")
-        PILImg.open(output).convert("RGB").save(jpg_output, "JPEG", quality=92)
+        with PILImg.open(output) as png:
+            _save_jpeg(np.asarray(png.convert("RGB")), jpg_output)
         os.remove(output)
         output = jpg_output
-    except: pass
+    except Exception as e:
+        print(f"[generate] JPEG conversion failed ({e}), returning PNG", file=sys.stderr)
     return {"output": output}
 
 
+def _inpaint_device():
+    """(device, half dtype): bf16 on CUDA, fp16 on MPS, fp32 on CPU"""
+    import torch
+    if torch.cuda.is_available():
+        return "cuda", torch.bfloat16
+    if torch.backends.mps.is_available():
+        return "mps", torch.float16
+    return "cpu", torch.float32
+
+
+# Set once half precision has failed on this backend; later tasks load fp32 directly
+_sdxl_full_precision = False
+
+
+@functools.lru_cache(maxsize=1)
+def _load_models(full_precision=False):
+    """Load CLIPSeg + SDXL inpaint once per process (reused by serve mode)
+
+    SDXL runs in half precision on GPU; full_precision=True reloads it in fp32
+    (fallback when an op is unsupported in half on this backend).
+    CLIPSeg is small and stays fp32 on CPU.
+    maxsize=1: only one pipeline is ever resident.
+    """
+    import torch
+    from transformers import CLIPSegProcessor, CLIPSegForImageSegmentation
+    from diffusers import StableDiffusionXLInpaintPipeline
+
+    proc = CLIPSegProcessor.from_pretrained("CIDAS/clipseg-rd64-refined")
+    model = CLIPSegForImageSegmentation.from_pretrained("CIDAS/clipseg-rd64-refined")
+
+    model_path = os.path.join(MODEL_DIR, "sdxl-inpaint")
+    if not os.path.exists(model_path):
+        model_path = "/tmp/sdxl-inpaint-model"
+
+    device, dtype = _inpaint_device()
+    if full_precision:
+        dtype = torch.float32
+    try:
+        pipe = StableDiffusionXLInpaintPipeline.from_pretrained(
+            model_path,
+            torch_dtype=dtype,
+            variant="fp16" if dtype != torch.float32 else None,
+        )
+    except (OSError, ValueError):
+        # No fp16 weight files: load the full weights and cast
+        pipe = StableDiffusionXLInpaintPipeline.from_pretrained(model_path, torch_dtype=dtype)
+    pipe = pipe.to(device)
+    pipe.enable_attention_slicing()
+    pipe.enable_vae_tiling()
+    return proc, model, pipe
+
+
 def segment_edit(input_image, target, prompt, invert=False, debug=False):
     """CLIPSeg mask + SDXL inpainting"""
+    global _sdxl_full_precision
     import torch
     import numpy as np
-    from PIL import Image, ImageFilter
-    from transformers import CLIPSegProcessor, CLIPSegForImageSegmentation
-    from diffusers import StableDiffusionXLInpaintPipeline
+    import cv2
+    from PIL import Image
     
     timestamp = int(time.time())
-    output = os.path.join(OUTPUT_DIR, f"edit_{timestamp}.png")
+    output = os.path.join(OUTPUT_DIR, f"edit_{timestamp}.jpg")
     mask_output = os.path.join(OUTPUT_DIR, f"mask_{timestamp}.png")
     
     # Load image
@@ -79,32 +161,28 @@ def segment_edit(input_image, target, prompt, invert=False, debug=False):
     
     img = img.resize((1024, 1024))
     
+    proc, model, pipe = _load_models(full_precision=_sdxl_full_precision)
+
     # CLIPSeg mask generation
     print(f"[CLIPSeg] Segmenting: {target}")
-    proc = CLIPSegProcessor.from_pretrained("CIDAS/clipseg-rd64-refined")
-    model = CLIPSegForImageSegmentation.from_pretrained("CIDAS/clipseg-rd64-refined")
     
     inputs = proc(text=[target], images=[img], return_tensors="pt", padding=True)
     with torch.no_grad():
         outputs = model(**inputs)
     
-    mask = torch.sigmoid(outputs.logits[0]).numpy()
-    
-    # Resize mask to 1024x1024
-    mask_img = Image.fromarray((mask * 255).astype(np.uint8))
-    mask_img = mask_img.resize((1024, 1024))
+    mask = torch.sigmoid(outputs.logits[0]).cpu().numpy()
     
-    # Threshold + Blur
-    mask_array = np.array(mask_img).astype(np.float32) / 255.0
-    mask_array = (mask_array > 0.3).astype(np.float32)
+    # Resize to 1024x1024 + threshold -> single uint8 array
+    mask = cv2.resize(mask, (1024, 1024), interpolation=cv2.INTER_LINEAR)
+    mask = (mask > 0.3).astype(np.uint8) * 255
     
     # Invert if needed (e.g. "change background" -> mask person -> invert)
     if invert:
-        mask_array = 1.0 - mask_array
+        cv2.bitwise_not(mask, mask)
     
     # Gaussian blur for smooth edges
-    mask_pil = Image.fromarray((mask_array * 255).astype(np.uint8))
-    mask_pil = mask_pil.filter(ImageFilter.GaussianBlur(radius=5))
+    cv2.GaussianBlur(mask, (0, 0), 5, dst=mask)
+    mask_pil = Image.fromarray(mask)
     
     # Save debug mask
     if debug:
@@ -114,32 +192,29 @@ def segment_edit(input_image, target, prompt, invert=False, debug=False):
     # SDXL Inpainting
     print("[SDXL] Inpainting...")
     
-    model_path = os.path.join(MODEL_DIR, "sdxl-inpaint")
-    if not os.path.exists(model_path):
-        model_path = "/tmp/sdxl-inpaint-model"
-    
-    pipe = StableDiffusionXLInpaintPipeline.from_pretrained(
-        model_path,
-        torch_dtype=torch.float32,
-    )
-    
-    result_img = pipe(
+    inpaint_args = dict(
         prompt=prompt,
         image=img,
         mask_image=mask_pil.convert("RGB"),
         num_inference_steps=30,
         guidance_scale=12.0,
         strength=0.95,
-    ).images[0]
-    
-    result_img.save(output)
-    # Convert PNG to JPEG for Telegram
+    )
     try:
-        jpg_out = output.replace(".png", ".jpg")
-        Image.open(output).convert("RGB").save(jpg_out, "JPEG", quality=92)
-        os.remove(output)
-        output = jpg_out
-    except: pass
+        result_img = pipe(**inpaint_args).images[0]
+    except (RuntimeError, TypeError) as e:
+        if pipe.unet.dtype == torch.float32:
+            raise
+        print(f"[SDXL] Half precision failed ({e}), retrying in fp32")
+        # Free the half-precision pipeline before the fp32 one is loaded
+        pipe = None
+        _load_models.cache_clear()
+        _sdxl_full_precision = True
+        _, _, pipe = _load_models(full_precision=True)
+        result_img = pipe(**inpaint_args).images[0]
+    
+    # JPEG for Telegram, encoded straight from the pipeline output
+    _save_jpeg(np.asarray(result_img.convert("RGB")), output)
     print(f"[Done] Saved: {output}")
     
     result = {"output": output}
@@ -148,9 +223,62 @@ def segment_edit(input_image, target, prompt, invert=False, debug=False):
     return result
 
 
+def _gateway(path, payload=None):
+    """GET (payload=None) or POST JSON to the Memory Gateway, return parsed JSON"""
+    data = None if payload is None else json.dumps(payload).encode("utf-8")
+    req = urllib.request.Request(GATEWAY_URL + path, data=data,
+                                 headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=10) as resp:
+        return json.loads(resp.read())
+
+
+def run_task(args):
+    """Run one task. args: {"mode": "generate"|"segment-edit", ...same fields as the CLI}"""
+    mode = args.get("mode")
+    if mode == "generate":
+        return generate_image(args["prompt"], args.get("model", "schnell"), int(args.get("steps", 4)),
+                              quantize=int(args.get("quantize", 8)))
+    if mode == "segment-edit":
+        return segment_edit(args["input"], args["target"], args["prompt"],
+                            bool(args.get("invert")), bool(args.get("debug")))
+    return {"error": f"Unknown mode: {mode}"}
+
+
+def serve():
+    """Worker loop: poll the gateway for ai-image tasks, keep models warm between tasks.
+
+    Task command is a JSON object for run_task(); stdout of the completed task
+    is the JSON result.
+    """
+    print(f"[serve] Polling {GATEWAY_URL} (target={SERVE_TARGET})", file=sys.stderr)
+    while True:
+        try:
+            task = _gateway(f"/v1/exec/poll?target={SERVE_TARGET}").get("task")
+        except Exception as e:
+            print(f"[serve] Poll failed: {e}", file=sys.stderr)
+            task = None
+        if not task:
+            time.sleep(SERVE_POLL_INTERVAL)
+            continue
+
+        try:
+            result = run_task(json.loads(task["command"]))
+        except Exception as e:
+            result = {"error": f"{type(e).__name__}: {e}"}
+        try:
+            _gateway("/v1/exec/complete", {
+                "task_id": task["id"],
+                "exit_code": 1 if "error" in result else 0,
+                "stdout": json.dumps(result),
+                "stderr": "",
+            })
+        except Exception as e:
+            print(f"[serve] Complete failed for {task['id']}: {e}", file=sys.stderr)
+
+
 def main():
     if len(sys.argv) < 2:
-        print(json.dumps({"error": "Usage: ai-image.py generate|segment-edit ..."}))
+        print(json.dumps({"error": "Usage: ai-image.py generate|segment-edit|serve ..."}))
         sys.exit(1)
     
     mode = sys.argv[1]
@@ -182,6 +310,9 @@ def main():
         result = segment_edit(input_image, target, prompt, invert, debug)
         print(json.dumps(result))
     
+    elif mode == "serve":
+        serve()
+    
     else:
         print(json.dumps({"error": f"Unknown mode: {mode}"}))
         sys.exit(1)
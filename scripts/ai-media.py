@@ -11,14 +11,20 @@ Usage:
   python3 ai-media.py animate --image /tmp/input.png --prompt "..." --output /tmp/out.mp4
   python3 ai-media.py status
 
+Daemon mode (AI_MEDIA_DAEMON=1): reads one JSON request per stdin line,
+  {"argv": ["animate", "--prompt", "...", ...]}
+and writes one JSON result per stdout line, keeping the ComfyUI websocket
+and HTTP connection open between requests.
+
 Models:
-  generate → Z-Image-Turbo 8-bit (mflux, MLX native, ~160s)
+  generate → Z-Image-Turbo 8-bit, 4-bit with Z_IMAGE_Q4=1 (mflux, MLX native, ~160s)
   edit     → FLUX.1 Dev Q5 + LoRA (ComfyUI API, img2img, ~10-15min)
   outpaint → FLUX.1 Dev Q5 + LoRA (ComfyUI API, outpainting, ~10-15min)
   animate  → Wan2.2 TI2V-5B (ComfyUI API, ~15-30min)
 
 Requirements:
   pip install mflux pillow-heif websocket-client
+  (websocket-client is optional: without it ComfyUI is polled over HTTP)
   ComfyUI running at localhost:8188 (for video only)
 
 Bug Fixes Applied (2026-02-07):
@@ -31,17 +37,51 @@ Bug Fixes Applied (2026-02-07):
 """
 
 import argparse
+import contextlib
+import functools
+import hashlib
+import http.client
 import json
+import mimetypes
+import mmap
 import os
+import random
+import secrets
+import shutil
 import signal
+import socket
 import subprocess
 import sys
+import threading
 import time
 import uuid
-import urllib.request
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+try:
+    import orjson  # C JSON codec for ComfyUI traffic (optional)
+except ImportError:
+    orjson = None
+
+try:
+    import websocket  # websocket-client: ComfyUI progress events (else /history polling)
+except ImportError:
+    websocket = None
+
+
+def _json_dumps(obj) -> bytes:
+    """JSON-encode to bytes (orjson when available; stdlib for what it rejects, e.g. >64-bit ints)"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            pass
+    return json.dumps(obj).encode()
+
+
+_json_loads = orjson.loads if orjson is not None else json.loads
+
 # ---------------------------------------------------------------------------
 # SIGTERM / SIGINT graceful shutdown
 # ---------------------------------------------------------------------------
@@ -64,9 +104,24 @@ signal.signal(signal.SIGINT, _sigterm_handler)
 # Config
 # ---------------------------------------------------------------------------
 COMFYUI_URL = os.environ.get("COMFYUI_URL", "http://127.0.0.1:8188")
+# How to wait for a prompt: "ws" (progress over websocket) or "http" (poll /history).
+# Falls back to "http" when websocket-client is not installed.
+COMFYUI_WAIT = os.environ.get("COMFYUI_WAIT", "ws")
 MFLUX_VENV = os.environ.get("MFLUX_VENV", os.path.expanduser("~/ai-tools/mflux-env"))
+# Persistent mflux process for `generate` (see mflux-daemon.py, needs mflux >= 0.21);
+# off by default, 1 = keep the model loaded between calls
+MFLUX_USE_DAEMON = os.environ.get("MFLUX_USE_DAEMON", "0") == "1"
+MFLUX_SOCKET = os.environ.get("MFLUX_SOCKET", "/tmp/mflux.sock")
+MFLUX_DAEMON_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mflux-daemon.py")
+# Z-Image-Turbo weight quantization when --quantize is not given.
+# Z_IMAGE_Q4=1 switches the default to 4-bit (faster MLX matmuls, ~half the memory of 8-bit).
+Z_IMAGE_Q4 = os.environ.get("Z_IMAGE_Q4", "0") == "1"
+Z_IMAGE_DEFAULT_QUANTIZE = 4 if Z_IMAGE_Q4 else 8
 COMFYUI_DIR = os.environ.get("COMFYUI_DIR", os.path.expanduser("~/ComfyUI"))
 WORKING_DIR = os.environ.get("AI_MEDIA_WORKDIR", "/tmp/ai-media")
+# content hash → filename already in ComfyUI's input/ (skips re-uploading the same image)
+UPLOAD_CACHE_PATH = os.environ.get("AI_MEDIA_UPLOAD_CACHE", os.path.expanduser("~/.ai-media/upload-cache.json"))
+UPLOAD_CACHE_MAX = 500
 
 # --- Wan2.2 TI2V-5B model config ---
 # UNET: fp16 safetensors (works on MPS, ~10GB)
@@ -88,8 +143,11 @@ WAN22_VAE = "wan2.2_vae.safetensors"
 WAN22_SHIFT = float(os.environ.get("WAN22_SHIFT", "3.0"))
 WAN22_SHIFT_I2V = float(os.environ.get("WAN22_SHIFT_I2V", "5.0"))
 
-# UNET GGUF option (if using quantized UNET instead of fp16)
-WAN22_USE_GGUF_UNET = os.environ.get("WAN22_USE_GGUF_UNET", "0") == "1"
+# UNET GGUF is DEFAULT: Q5_K_S (~3.5GB) vs fp16 (~10GB). The denoising loop is
+# memory-bandwidth bound on MPS, so ~5-bit weights give ~2x throughput for a
+# slight quality loss; fp16 thrashes on 32GB. Use WAN22_USE_GGUF_UNET=0 or
+# `animate --precision fp16` to get the full-precision UNET.
+WAN22_USE_GGUF_UNET = os.environ.get("WAN22_USE_GGUF_UNET", "1") == "1"
 WAN22_GGUF_UNET_MODEL = os.environ.get("WAN22_GGUF_UNET_MODEL", "wan2.2-ti2v-5b-Q5_K_S.gguf")
 
 # NOTE: clip_vision_h.safetensors is NOT needed for 5B model.
@@ -136,14 +194,45 @@ def ensure_workdir():
     os.makedirs(WORKING_DIR, exist_ok=True)
 
 
+def move_output(src: str, dst: str):
+    """Move a downloaded output to its final path: rename when on the same
+    filesystem (the usual case, both live in WORKING_DIR), copy otherwise."""
+    try:
+        os.replace(src, dst)
+    except OSError:
+        shutil.move(src, dst)
+
+
+@functools.lru_cache(maxsize=None)
 def get_mflux_bin(cmd: str) -> str:
-    """Get mflux binary path, preferring venv if it exists."""
+    """Get mflux binary path, preferring venv if it exists. (binaries don't move at runtime)"""
     venv_bin = os.path.join(MFLUX_VENV, "bin", cmd)
     if os.path.exists(venv_bin):
         return venv_bin
     return cmd
 
 
+@functools.lru_cache(maxsize=None)
+def _model_dir_files(subdir: str) -> frozenset:
+    """Names of the files in ComfyUI models/<subdir> (one scandir per directory).
+
+    Cached only for the duration of one check_status() call, which clears it first.
+    """
+    try:
+        with os.scandir(os.path.join(COMFYUI_DIR, "models", subdir)) as it:
+            return frozenset(e.name for e in it if e.is_file())
+    except OSError:
+        return frozenset()
+
+
+def _model_path(subdir: str, name: str) -> str | None:
+    """Path of a ComfyUI model file (models/<subdir>/<name>), None if missing."""
+    path = os.path.join(COMFYUI_DIR, "models", subdir, name)
+    if os.sep in name:  # nested model folder: not in the top-level listing
+        return path if os.path.exists(path) else None
+    return path if name in _model_dir_files(subdir) else None
+
+
 MAX_IMAGE_DIMENSION = 1024  # Max pixels on longest side (FLUX native resolution = 1024x1024)
 # Previously 1536 but MPS convolution_overrideable errors still occurred at that size.
 # 1024 matches FLUX native resolution, so no quality loss from downscaling further.
@@ -199,8 +288,54 @@ def convert_and_resize(input_path: str) -> str:
 # ===========================================================================
 # IMAGE GENERATION (Z-Image-Turbo via mflux)
 # ===========================================================================
+def _mflux_daemon_request(argv: list, timeout: int = 600) -> dict | None:
+    """Run one generation on mflux-daemon. None if the daemon is unreachable."""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(MFLUX_SOCKET)
+            sock.sendall(_json_dumps({"argv": argv}) + b"\n")
+            line = sock.makefile("rb").readline()
+        return _json_loads(line)
+    except (OSError, ValueError):
+        return None
+
+
+def _ensure_mflux_daemon() -> bool:
+    """Start mflux-daemon in the background if its socket is not up yet."""
+    def _alive():
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.connect(MFLUX_SOCKET)
+            return True
+        except OSError:
+            return False
+
+    if _alive():
+        return True
+    python = os.path.join(MFLUX_VENV, "bin", "python3")
+    if not os.path.exists(python):
+        python = sys.executable
+    print("[ai-media] Starting mflux daemon...", file=sys.stderr)
+    proc = subprocess.Popen(
+        [python, MFLUX_DAEMON_SCRIPT],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    # Socket comes up right after `import mflux` (weights load on first request)
+    for _ in range(60):
+        time.sleep(0.5)
+        if _alive():
+            return True
+        if proc.poll() is not None:
+            break
+    print("[ai-media] mflux daemon unavailable, falling back to CLI", file=sys.stderr)
+    return False
+
+
 def cmd_generate(args):
-    """Text-to-image using Z-Image-Turbo 8-bit."""
+    """Text-to-image using Z-Image-Turbo (8-bit, or 4-bit with Z_IMAGE_Q4=1)."""
     ensure_workdir()
     output = args.output or os.path.join(WORKING_DIR, f"gen_{uuid.uuid4().hex[:8]}.png")
 
@@ -210,7 +345,7 @@ def cmd_generate(args):
         "--width", str(args.width or 1024),
         "--height", str(args.height or 1024),
         "--steps", str(args.steps),
-        "-q", str(args.quantize or 8),
+        "-q", str(args.quantize or Z_IMAGE_DEFAULT_QUANTIZE),
         "--output", output,
     ]
     if args.seed is not None:
@@ -220,12 +355,21 @@ def cmd_generate(args):
     print(f"[ai-media] CMD: {' '.join(cmd)}", file=sys.stderr)
 
     t0 = time.time()
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    elapsed = time.time() - t0
+    resp = None
+    if MFLUX_USE_DAEMON and _ensure_mflux_daemon():
+        resp = _mflux_daemon_request(cmd[1:])
+    if resp is not None:
+        elapsed = time.time() - t0
+        if not resp.get("ok"):
+            print(f"[ai-media] mflux daemon: {resp.get('error')}", file=sys.stderr)
+            return {"ok": False, "error": resp.get("error"), "elapsed": elapsed}
+    else:
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        elapsed = time.time() - t0
 
-    if result.returncode != 0:
-        print(f"[ai-media] STDERR: {result.stderr}", file=sys.stderr)
-        return {"ok": False, "error": result.stderr, "elapsed": elapsed}
+        if result.returncode != 0:
+            print(f"[ai-media] STDERR: {result.stderr}", file=sys.stderr)
+            return {"ok": False, "error": result.stderr, "elapsed": elapsed}
 
     actual_output = find_output_file(output, WORKING_DIR)
     return {"ok": True, "path": actual_output, "elapsed": round(elapsed, 1)}
@@ -702,11 +846,9 @@ def cmd_edit(args):
         fname = output_files[0].get("filename", "")
         subfolder = output_files[0].get("subfolder", "")
         ftype = output_files[0].get("type", "output")
-        out_path = comfyui_download_output(fname, subfolder, ftype)
+        out_path = comfyui_download_output(fname, subfolder, ftype, dest=output)
 
         if out_path:
-            import shutil
-            shutil.move(out_path, output)
             return {"ok": True, "path": output, "elapsed": round(elapsed, 1)}
 
         return {"ok": False, "error": "Could not retrieve image from ComfyUI", "elapsed": round(elapsed, 1)}
@@ -1293,11 +1435,9 @@ def cmd_edit_fill(args):
         fname = output_files[0].get("filename", "")
         subfolder = output_files[0].get("subfolder", "")
         ftype = output_files[0].get("type", "output")
-        out_path = comfyui_download_output(fname, subfolder, ftype)
+        out_path = comfyui_download_output(fname, subfolder, ftype, dest=output)
 
         if out_path:
-            import shutil
-            shutil.move(out_path, output)
             return {"ok": True, "path": output, "elapsed": round(elapsed, 1)}
 
         return {"ok": False, "error": "Could not retrieve image from ComfyUI", "elapsed": round(elapsed, 1)}
@@ -1389,8 +1529,7 @@ def cmd_undress_fill(args):
             # GIF animation: save a copy of mask before uploading
             # ROLLBACK: remove saved_mask_path logic, restore os.unlink(cloth_mask_path) below
             saved_mask_path = os.path.join(WORKING_DIR, f"undress_mask_kept_{uuid.uuid4().hex[:8]}.png")
-            import shutil as _shutil
-            _shutil.copy2(cloth_mask_path, saved_mask_path)
+            shutil.copy2(cloth_mask_path, saved_mask_path)
 
             mask_name = comfyui_upload_image(cloth_mask_path)
             if mask_name:
@@ -1432,11 +1571,9 @@ def cmd_undress_fill(args):
         fname = output_files[0].get("filename", "")
         subfolder = output_files[0].get("subfolder", "")
         ftype = output_files[0].get("type", "output")
-        out_path = comfyui_download_output(fname, subfolder, ftype)
+        out_path = comfyui_download_output(fname, subfolder, ftype, dest=output)
 
         if out_path:
-            import shutil
-            shutil.move(out_path, output)
             # GIF animation: include input_path and mask_path for process visualization
             # ROLLBACK: remove input_path and mask_path from return dict
             result_dict = {"ok": True, "path": output, "elapsed": round(elapsed, 1),
@@ -1611,11 +1748,9 @@ def cmd_undress(args):
         fname = output_files[0].get("filename", "")
         subfolder = output_files[0].get("subfolder", "")
         ftype = output_files[0].get("type", "output")
-        out_path = comfyui_download_output(fname, subfolder, ftype)
+        out_path = comfyui_download_output(fname, subfolder, ftype, dest=output)
 
         if out_path:
-            import shutil
-            shutil.move(out_path, output)
             return {"ok": True, "path": output, "elapsed": round(elapsed, 1)}
 
         return {"ok": False, "error": "Could not retrieve image from ComfyUI", "elapsed": round(elapsed, 1)}
@@ -1754,10 +1889,9 @@ def cmd_outpaint(args):
         fname = output_files[0].get("filename", "")
         subfolder = output_files[0].get("subfolder", "")
         ftype = output_files[0].get("type", "output")
-        out_path = comfyui_download_output(fname, subfolder, ftype)
+        out_path = comfyui_download_output(fname, subfolder, ftype, dest=output)
 
         if out_path:
-            import shutil
             # Post-process: blend original image back into result to eliminate boundary
             try:
                 from PIL import Image, ImageFilter
@@ -1797,7 +1931,6 @@ def cmd_outpaint(args):
             except Exception as blend_err:
                 print(f"[ai-media] Post-blend skipped: {blend_err}", file=sys.stderr)
 
-            shutil.move(out_path, output)
             return {"ok": True, "path": output, "elapsed": round(elapsed, 1)}
 
         return {"ok": False, "error": "Could not retrieve image from ComfyUI", "elapsed": round(elapsed, 1)}
@@ -2220,11 +2353,9 @@ def cmd_edit_kontext(args):
         fname = output_files[0].get("filename", "")
         subfolder = output_files[0].get("subfolder", "")
         ftype = output_files[0].get("type", "output")
-        out_path = comfyui_download_output(fname, subfolder, ftype)
+        out_path = comfyui_download_output(fname, subfolder, ftype, dest=output)
 
         if out_path:
-            import shutil
-            shutil.move(out_path, output)
             return {"ok": True, "path": output, "elapsed": round(elapsed, 1)}
 
         return {"ok": False, "error": "Could not retrieve image from ComfyUI", "elapsed": round(elapsed, 1)}
@@ -2390,6 +2521,12 @@ def build_flux_kontext_workflow(image_name: str, prompt: str, steps: int = 20,
 # ===========================================================================
 # VIDEO GENERATION (Wan2.2 TI2V-5B via ComfyUI API)
 # ===========================================================================
+def _video_batch_size(requested: int, width: int, height: int) -> int:
+    """Videos per KSampler pass: at most 4 up to 768x768 pixels, 2 above."""
+    limit = 4 if width * height <= 768 * 768 else 2
+    return max(1, min(requested or 1, limit))
+
+
 def cmd_animate(args):
     """Image-to-video or text-to-video using Wan2.2 TI2V-5B."""
     ensure_workdir()
@@ -2439,7 +2576,8 @@ def cmd_animate(args):
             image_name=uploaded_name,
             width=width, height=height,
             num_frames=frames, steps=steps,
-            seed=args.seed,
+            seed=args.seed, precision=args.precision,
+            batch=_video_batch_size(args.batch, width, height),
         )
         mode = "I2V"
     else:
@@ -2450,12 +2588,16 @@ def cmd_animate(args):
             prompt=args.prompt,
             width=width, height=height,
             num_frames=frames, steps=steps,
-            seed=args.seed,
+            seed=args.seed, precision=args.precision,
+            batch=_video_batch_size(args.batch, width, height),
         )
         mode = "T2V"
 
     shift_used = WAN22_SHIFT_I2V if mode == "I2V" else WAN22_SHIFT
-    print(f"[ai-media] {mode}: {width}x{height}, {frames} frames, {steps} steps, shift={shift_used}", file=sys.stderr)
+    unet_used = args.precision or ("gguf" if WAN22_USE_GGUF_UNET else "fp16")
+    batch = _video_batch_size(args.batch, width, height)
+    print(f"[ai-media] {mode}: {width}x{height}, {frames} frames, {steps} steps, shift={shift_used}, unet={unet_used}"
+          + (f", batch={batch}" if batch > 1 else ""), file=sys.stderr)
     t0 = time.time()
 
     try:
@@ -2474,41 +2616,168 @@ def cmd_animate(args):
     if not output_files:
         return {"ok": False, "error": "No output files from ComfyUI", "elapsed": round(elapsed, 1)}
 
-    # Find video output
+    # Find video output. Videos are tried first so preview images listed before
+    # them are never downloaded; an image is only fetched if no video arrives.
     final_output = None
-    for f_info in output_files:
-        fname = f_info.get("filename", "")
-        subfolder = f_info.get("subfolder", "")
-        ftype = f_info.get("type", "output")
-
-        out_path = comfyui_download_output(fname, subfolder, ftype)
-        if out_path:
-            if fname.endswith((".mp4", ".webm", ".gif")):
-                final_output = out_path
-                break
-            elif not final_output:
-                final_output = out_path
+    candidates = [(f.get("filename", "").endswith((".mp4", ".webm", ".gif")), f) for f in output_files]
+    candidates.sort(key=lambda c: not c[0])  # stable: keeps ComfyUI's order within each group
+    for is_video, chosen in candidates:
+        final_output = comfyui_download_output(chosen.get("filename", ""), chosen.get("subfolder", ""),
+                                               chosen.get("type", "output"), dest=output if is_video else None)
+        if final_output:
+            break
 
     if not final_output:
         return {"ok": False, "error": "Could not retrieve video from ComfyUI", "elapsed": round(elapsed, 1)}
 
     if final_output != output:
-        import shutil
-        shutil.move(final_output, output)
+        move_output(final_output, output)
         final_output = output
 
-    return {"ok": True, "path": final_output, "elapsed": round(elapsed, 1)}
+    result = {"ok": True, "path": final_output, "elapsed": round(elapsed, 1)}
+    if batch > 1:
+        # Remaining videos of the batch → <output stem>_1.mp4, _2.mp4, ... fetched
+        # concurrently (each worker thread gets its own keep-alive connection)
+        stem, ext = os.path.splitext(output)
+        rest = [f_info for is_video, f_info in candidates if is_video and f_info is not chosen]
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            paths = pool.map(lambda item: comfyui_download_output(
+                item[1].get("filename", ""), item[1].get("subfolder", ""),
+                item[1].get("type", "output"), dest=f"{stem}_{item[0]}{ext}"), enumerate(rest, 1))
+            result["paths"] = [final_output] + [path for path in paths if path]
+    return result
 
 
 # ===========================================================================
 # ComfyUI API helpers
 # ===========================================================================
+# One keep-alive connection per thread, reused for every ComfyUI HTTP call
+_comfyui_http = threading.local()
+
+
+def comfyui_request(method: str, path: str, body: bytes = None, headers: dict = None,
+                    timeout: float = 30, retries: int = None, sink=None) -> bytes:
+    """HTTP request to ComfyUI over a persistent connection. Returns the body.
+
+    Raises on HTTP >= 400. A connection the server closed while idle is
+    reopened once. Connection errors on GET (idempotent) are retried up to
+    `retries` times (default 3) with 0.1s/0.2s/0.4s backoff; POSTs are not.
+    body may be a list of bytes-like parts: they are sent one after another
+    (Content-Length set from their sizes) without being joined in memory.
+    With sink (a writable binary file), the response body is streamed into it
+    in 1 MiB chunks instead of being returned (returns b"").
+    """
+    if isinstance(body, list):
+        headers = {**(headers or {}), "Content-Length": str(sum(len(p) for p in body))}
+    if retries is None:
+        retries = 3 if method == "GET" else 0
+    for attempt in range(retries + 1):
+        try:
+            return _comfyui_request_once(method, path, body, headers, timeout, sink)
+        except (ConnectionError, TimeoutError, http.client.HTTPException):
+            if attempt >= retries:
+                raise
+            time.sleep(0.1 * 2 ** attempt)
+
+
+def _comfyui_request_once(method: str, path: str, body, headers: dict, timeout: float, sink=None) -> bytes:
+    url = urllib.parse.urlsplit(COMFYUI_URL)
+    for _ in range(2):
+        # A retry must resend the whole body: rewind file-like parts a failed attempt consumed
+        for part in body if isinstance(body, list) else ():
+            if hasattr(part, "seek"):
+                part.seek(0)
+        conn = getattr(_comfyui_http, "conn", None)
+        if conn is None:
+            conn_cls = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+            conn = _comfyui_http.conn = conn_cls(url.netloc, timeout=timeout)
+        reused = conn.sock is not None
+        conn.timeout = timeout
+        if reused:
+            conn.sock.settimeout(timeout)
+        try:
+            conn.request(method, url.path.rstrip("/") + path, body=body, headers=headers or {})
+            resp = conn.getresponse()
+            if sink is not None and resp.status < 400:
+                sink.seek(0)
+                sink.truncate()
+                shutil.copyfileobj(resp, sink, 1 << 20)
+                data = b""
+            else:
+                data = resp.read()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            conn.close()
+            _comfyui_http.conn = None
+            if not reused:
+                raise
+            continue
+        except Exception:
+            conn.close()
+            _comfyui_http.conn = None
+            raise
+        if resp.status >= 400:
+            raise Exception(f"ComfyUI HTTP {resp.status} {path}: {data[:500].decode(errors='replace')}")
+        return data
+
+
+# One random boundary per process; the fixed parts below are encoded once
+_MULTIPART_BOUNDARY = secrets.token_hex(16)
+_MULTIPART_CONTENT_TYPE = f"multipart/form-data; boundary={_MULTIPART_BOUNDARY}"
+_MULTIPART_END = f"--{_MULTIPART_BOUNDARY}--\r\n".encode()
+
+
+@functools.lru_cache(maxsize=64)
+def _multipart_field(name: str, value: str) -> bytes:
+    return (f"--{_MULTIPART_BOUNDARY}\r\n"
+            f'Content-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n').encode()
+
+
+def encode_multipart_formdata(fields: dict) -> tuple[list, str]:
+    """multipart/form-data body for {name: value | (filename, data, content_type)}.
+
+    Returns (body parts, content_type header value). File data is passed through
+    as-is (e.g. an mmap), so pass the parts list straight to comfyui_request.
+    """
+    parts = []
+    for name, value in fields.items():
+        if isinstance(value, tuple):
+            filename, data, content_type = value
+            parts.append(
+                f"--{_MULTIPART_BOUNDARY}\r\n"
+                f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                f"Content-Type: {content_type}\r\n\r\n".encode()
+            )
+            parts.append(data)
+            parts.append(b"\r\n")
+        else:
+            parts.append(_multipart_field(name, str(value)))
+    parts.append(_MULTIPART_END)
+    return parts, _MULTIPART_CONTENT_TYPE
+
+
+def comfyui_post_json(path: str, payload: dict, timeout: float = 30) -> bytes:
+    return comfyui_request("POST", path, _json_dumps(payload),
+                           {"Content-Type": "application/json"}, timeout)
+
+
+# monotonic time of the last successful /system_stats probe
+_comfyui_seen_up = None
+COMFYUI_UP_TTL = 5.0
+
+
 def comfyui_is_running() -> bool:
+    """Probe ComfyUI. A positive answer is reused for COMFYUI_UP_TTL seconds;
+    negative answers are never cached (ensure_comfyui polls them during startup)."""
+    global _comfyui_seen_up
+    if _comfyui_seen_up is not None and time.monotonic() - _comfyui_seen_up < COMFYUI_UP_TTL:
+        return True
     try:
-        req = urllib.request.urlopen(f"{COMFYUI_URL}/system_stats", timeout=3)
-        return req.status == 200
+        comfyui_request("GET", "/system_stats", timeout=3, retries=0)
     except Exception:
+        _comfyui_seen_up = None
         return False
+    _comfyui_seen_up = time.monotonic()
+    return True
 
 
 def ensure_comfyui() -> bool:
@@ -2529,14 +2798,18 @@ def ensure_comfyui() -> bool:
         start_new_session=True,
     )
 
-    # 最大120秒待機
-    for i in range(60):
-        time.sleep(2)
+    # 最大120秒待機（0.25秒から1.5倍ずつ、上限2秒の間隔でポーリング）
+    start = last_report = time.monotonic()
+    delay = 0.25
+    while time.monotonic() - start < 120:
+        time.sleep(delay)
+        delay = min(delay * 1.5, 2.0)
         if comfyui_is_running():
-            print(f"[ai-media] ComfyUI started ({(i+1)*2}s)", file=sys.stderr)
+            print(f"[ai-media] ComfyUI started ({time.monotonic() - start:.1f}s)", file=sys.stderr)
             return True
-        if i % 5 == 4:
-            print(f"[ai-media] Waiting for ComfyUI... ({(i+1)*2}s)", file=sys.stderr)
+        if time.monotonic() - last_report >= 10:
+            last_report = time.monotonic()
+            print(f"[ai-media] Waiting for ComfyUI... ({last_report - start:.0f}s)", file=sys.stderr)
 
     print("[ai-media] ComfyUI failed to start within 120s", file=sys.stderr)
     return False
@@ -2548,170 +2821,306 @@ def comfyui_free_memory():
     Uses POST /free with unload_models=true and free_memory=true.
     """
     try:
-        payload = json.dumps({"unload_models": True, "free_memory": True}).encode()
-        req = urllib.request.Request(
-            f"{COMFYUI_URL}/free",
-            data=payload,
-            headers={"Content-Type": "application/json"},
-            method="POST"
-        )
-        urllib.request.urlopen(req, timeout=10)
+        comfyui_post_json("/free", {"unload_models": True, "free_memory": True}, timeout=10)
         print("[ai-media] ComfyUI models unloaded, memory freed", file=sys.stderr)
     except Exception as e:
         print(f"[ai-media] ComfyUI free memory failed (non-critical): {e}", file=sys.stderr)
 
 
-def comfyui_upload_image(image_path: str) -> str:
-    """Upload image to ComfyUI input folder. Returns the filename on server."""
-    import mimetypes
-    boundary = uuid.uuid4().hex
-    filename = os.path.basename(image_path)
+def _load_upload_cache() -> dict:
+    try:
+        with open(UPLOAD_CACHE_PATH, "rb") as f:
+            return _json_loads(f.read())
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_upload_cache(cache: dict):
+    if len(cache) > UPLOAD_CACHE_MAX:
+        newest = sorted(cache.items(), key=lambda kv: kv[1].get("mtime", 0))[-UPLOAD_CACHE_MAX:]
+        cache = dict(newest)
+    try:
+        os.makedirs(os.path.dirname(UPLOAD_CACHE_PATH), exist_ok=True)
+        tmp = f"{UPLOAD_CACHE_PATH}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(_json_dumps(cache))
+        os.replace(tmp, UPLOAD_CACHE_PATH)
+    except OSError as e:
+        print(f"[ai-media] Upload cache not saved: {e}", file=sys.stderr)
+
+
+def _comfyui_has_input(filename: str) -> bool:
+    """True if ComfyUI still serves `filename` from input/ (1-byte range request)."""
+    query = urllib.parse.urlencode({"filename": filename, "type": "input"})
+    try:
+        comfyui_request("GET", f"/view?{query}", headers={"Range": "bytes=0-0"}, timeout=5, retries=0)
+        return True
+    except Exception:
+        return False
 
-    with open(image_path, "rb") as f:
-        file_data = f.read()
 
+def comfyui_upload_image(image_path: str) -> str:
+    """Upload image to ComfyUI input folder. Returns the filename on server.
+
+    Files are stored under a content hash (cache_<blake2b>.<ext>), so an image
+    that is already on the server is not uploaded again.
+    """
     content_type = mimetypes.guess_type(image_path)[0] or "image/png"
 
-    body = (
-        f"--{boundary}\r\n"
-        f'Content-Disposition: form-data; name="image"; filename="{filename}"\r\n'
-        f"Content-Type: {content_type}\r\n\r\n"
-    ).encode() + file_data + f"\r\n--{boundary}\r\n".encode() + (
-        f'Content-Disposition: form-data; name="type"\r\n\r\ninput\r\n'
-        f"--{boundary}\r\n"
-        f'Content-Disposition: form-data; name="overwrite"\r\n\r\ntrue\r\n'
-        f"--{boundary}--\r\n"
-    ).encode()
-
-    req = urllib.request.Request(
-        f"{COMFYUI_URL}/upload/image",
-        data=body,
-        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
-        method="POST"
-    )
     try:
-        resp = urllib.request.urlopen(req, timeout=30)
-        result = json.loads(resp.read())
-        return result.get("name", filename)
+        with open(image_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            # Map the file instead of reading it into a bytes object. The part is a memoryview,
+            # which http.client hands to sendall() as-is (a file-like part would be
+            # copied in 8 KiB reads and could not be resent after a reconnect).
+            with (mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else memoryview(b"")) as mapped, \
+                    memoryview(mapped) as file_data:
+                digest = hashlib.blake2b(file_data, digest_size=16).hexdigest()
+                cache = _load_upload_cache()
+                cached = cache.get(digest)
+                if cached and _comfyui_has_input(cached["name"]):
+                    print(f"[ai-media] Upload skipped (already on server): {cached['name']}", file=sys.stderr)
+                    return cached["name"]
+
+                filename = f"cache_{digest}{os.path.splitext(image_path)[1].lower()}"
+                body, body_type = encode_multipart_formdata({
+                    "image": (filename, file_data, content_type),
+                    "type": "input",
+                    "overwrite": "true",
+                })
+                result = _json_loads(comfyui_request(
+                    "POST", "/upload/image", body, {"Content-Type": body_type},
+                ))
+        name = result.get("name", filename)
+        cache[digest] = {"name": name, "mtime": time.time()}
+        _save_upload_cache(cache)
+        return name
     except Exception as e:
         print(f"[ai-media] Upload failed: {e}", file=sys.stderr)
         return None
 
 
-def comfyui_queue_and_wait(workflow: dict, timeout: int = 2400) -> list:
-    """Queue workflow and wait for completion. Returns list of output file infos."""
-    import websocket
+# One clientId per process; the websocket stays open between prompts so a
+# long-running process (AI_MEDIA_DAEMON=1) skips the handshake and ComfyUI's
+# per-client session setup on every request.
+_COMFYUI_CLIENT_ID = str(uuid.uuid4())
+_comfyui_ws_conn = None
 
-    client_id = str(uuid.uuid4())
 
-    ws = websocket.WebSocket()
-    ws.settimeout(30)  # Fix 4: short timeout for SIGTERM responsiveness + keep-alive
+def _comfyui_ws():
+    """Return the process-wide ComfyUI websocket, reconnecting if it went away."""
+    global _comfyui_ws_conn
+    ws = _comfyui_ws_conn
+    if ws is not None:
+        # Drop frames queued while idle (status, monitor stats). A dead socket
+        # shows up here as an error → open a fresh one.
+        try:
+            ws.settimeout(0.01)
+            for _ in range(10000):
+                ws.recv_data()
+        except websocket.WebSocketTimeoutException:
+            return ws
+        except (websocket.WebSocketException, OSError):
+            pass
+        ws.close()
+        _comfyui_ws_conn = None
+
+    # Text frames are validated by the JSON decoder (and most are dropped unread);
+    # without wsaccel, websocket-client's own UTF-8 check is a per-byte Python loop.
+    ws = websocket.WebSocket(skip_utf8_validation=True)
+    ws.settimeout(30)
     ws_url = COMFYUI_URL.replace("http://", "ws://").replace("https://", "wss://")
-    ws.connect(f"{ws_url}/ws?clientId={client_id}")
-
-    payload = json.dumps({"prompt": workflow, "client_id": client_id}).encode()
-    req = urllib.request.Request(
-        f"{COMFYUI_URL}/prompt",
-        data=payload,
-        headers={"Content-Type": "application/json"},
-        method="POST"
-    )
-    resp = urllib.request.urlopen(req, timeout=30)
-    result = json.loads(resp.read())
+    ws.connect(f"{ws_url}/ws?clientId={_COMFYUI_CLIENT_ID}")
+    _comfyui_ws_conn = ws
+    return ws
 
+
+def _comfyui_ws_drop():
+    """Close the shared websocket (after a transport error)."""
+    global _comfyui_ws_conn
+    if _comfyui_ws_conn is not None:
+        _comfyui_ws_conn.close()
+        _comfyui_ws_conn = None
+
+
+def comfyui_queue_and_wait(workflow: dict, timeout: int = 2400) -> list:
+    """Queue workflow and wait for completion. Returns list of output file infos."""
+    use_ws = COMFYUI_WAIT != "http" and websocket is not None
+    ws = _comfyui_ws() if use_ws else None
+
+    result = _json_loads(comfyui_post_json("/prompt", {"prompt": workflow, "client_id": _COMFYUI_CLIENT_ID}))
     if "error" in result:
-        ws.close()
         raise Exception(f"ComfyUI error: {result['error']}")
 
     prompt_id = result["prompt_id"]
     print(f"[ai-media] Queued prompt: {prompt_id}", file=sys.stderr)
+    if not use_ws:
+        return comfyui_wait_http(prompt_id, timeout)
 
     # Fix 3: keep-alive output to prevent Node.js activity timeout
     KEEPALIVE_INTERVAL = 30
-    last_keepalive = time.time()
+    last_keepalive = time.monotonic()
 
-    start = time.time()
-    while time.time() - start < timeout:
+    # Only these events are handled. Everything else (crystools monitor frames,
+    # binary previews) is dropped before decoding.
+    WANTED_EVENTS = (b'"progress"', b'"executing"', b'"executed"', b'"execution_error"', b'"status"',
+                     b'"execution_cached"')
+
+    last_pct = -1  # progress is printed only when the integer percent changes
+    last_print = 0.0  # ...and in-place (\r) updates at most every PROGRESS_MIN_INTERVAL
+    PROGRESS_MIN_INTERVAL = 0.2
+    # UI outputs from `executed` events: saves fetching /history, which echoes the whole workflow
+    outputs = []
+
+    start = time.monotonic()
+    deadline = start + timeout
+    while (remaining := deadline - time.monotonic()) > 0:
+        # Fix 4: short recv timeout for SIGTERM responsiveness + keep-alive
+        ws.settimeout(min(30, remaining))
         try:
-            msg = ws.recv()
-            if isinstance(msg, str):
-                data = json.loads(msg)
-                msg_type = data.get("type", "")
-
-                if msg_type == "progress":
-                    d = data.get("data", {})
-                    pct = d.get("value", 0) / max(d.get("max", 1), 1) * 100
+            opcode, msg = ws.recv_data()
+        except websocket.WebSocketTimeoutException:
+            opcode, msg = None, b""
+        except (websocket.WebSocketException, OSError) as e:
+            # The prompt is already queued: finish by polling /history instead of failing
+            print(f"\n[ai-media] WebSocket lost ({e}), polling /history", file=sys.stderr, flush=True)
+            _comfyui_ws_drop()
+            return comfyui_wait_http(prompt_id, int(remaining) + 1)
+
+        if opcode == websocket.ABNF.OPCODE_TEXT and any(ev in msg for ev in WANTED_EVENTS):
+            data = _json_loads(msg)
+            msg_type = data.get("type", "")
+            last_keepalive = time.monotonic()
+
+            if msg_type == "progress":
+                d = data.get("data", {})
+                pct = int(d.get("value", 0) / max(d.get("max", 1), 1) * 100)
+                now = time.monotonic()
+                if pct != last_pct and (pct % 10 == 0 or now - last_print >= PROGRESS_MIN_INTERVAL):
+                    last_pct, last_print = pct, now
                     # Fix 2: 10%刻みで改行付き出力（Node.js stderrバッファ確実フラッシュ）
-                    if int(pct) % 10 == 0:
-                        print(f"[ai-media] Progress: {pct:.0f}%", file=sys.stderr, flush=True)
+                    if pct % 10 == 0:
+                        print(f"[ai-media] Progress: {pct}%", file=sys.stderr, flush=True)
                     else:
-                        print(f"\r[ai-media] Progress: {pct:.0f}%", end="", file=sys.stderr, flush=True)
-
-                elif msg_type == "status":
-                    # Heartbeat: keep activity timeout alive during model loading
-                    d = data.get("data", {}).get("status", {})
-                    q = d.get("exec_info", {}).get("queue_remaining", "?")
-                    print(f"\r[ai-media] Status: queue={q}, loading...", end="", file=sys.stderr, flush=True)
-
-                elif msg_type == "execution_cached":
-                    print(f"[ai-media] Cached nodes reused", file=sys.stderr, flush=True)
-
-                elif msg_type == "executed":
-                    d = data.get("data", {})
-                    if d.get("prompt_id") == prompt_id:
-                        print(f"\n[ai-media] Execution complete!", file=sys.stderr)
-                        ws.close()
-                        return comfyui_get_outputs(prompt_id)
-
-                elif msg_type == "execution_error":
-                    d = data.get("data", {})
-                    if d.get("prompt_id") == prompt_id:
-                        ws.close()
-                        raise Exception(f"Execution error: {d.get('exception_message', 'unknown')}")
-        except websocket.WebSocketTimeoutException:
-            # Fix 3: keep-alive output during silent periods (model loading, VAE decode)
-            now = time.time()
-            if now - last_keepalive >= KEEPALIVE_INTERVAL:
-                elapsed_min = (now - start) / 60
-                print(f"[ai-media] Waiting for ComfyUI... ({elapsed_min:.1f}min elapsed)",
-                      file=sys.stderr, flush=True)
-                last_keepalive = now
-            continue
+                        print(f"\r[ai-media] Progress: {pct}%", end="", file=sys.stderr, flush=True)
+
+            elif msg_type == "status":
+                # Heartbeat: keep activity timeout alive during model loading
+                d = data.get("data", {}).get("status", {})
+                q = d.get("exec_info", {}).get("queue_remaining", "?")
+                print(f"\r[ai-media] Status: queue={q}, loading...", end="", file=sys.stderr, flush=True)
+
+            elif msg_type == "execution_cached":
+                print(f"[ai-media] Cached nodes reused", file=sys.stderr, flush=True)
+
+            elif msg_type == "executed":
+                d = data.get("data", {})
+                if d.get("prompt_id") == prompt_id:
+                    outputs.extend(_ui_output_files(d.get("output") or {}))
+
+            elif msg_type == "executing":
+                # node=None is ComfyUI's end-of-prompt signal. `executed` fires
+                # once per output node, so it can arrive before the last one.
+                d = data.get("data", {})
+                if d.get("node") is None and d.get("prompt_id") == prompt_id:
+                    print(f"\n[ai-media] Execution complete!", file=sys.stderr)
+                    # Older ComfyUI doesn't announce cached output nodes → ask /history
+                    return outputs or comfyui_get_outputs(prompt_id)
+
+            elif msg_type == "execution_error":
+                d = data.get("data", {})
+                if d.get("prompt_id") == prompt_id:
+                    raise Exception(f"Execution error: {d.get('exception_message', 'unknown')}")
+
+        # Fix 3: keep-alive output during silent periods (model loading, VAE decode)
+        now = time.monotonic()
+        if now - last_keepalive >= KEEPALIVE_INTERVAL:
+            elapsed_min = (now - start) / 60
+            print(f"[ai-media] Waiting for ComfyUI... ({elapsed_min:.1f}min elapsed)",
+                  file=sys.stderr, flush=True)
+            last_keepalive = now
 
-    ws.close()
     raise Exception(f"Timeout after {timeout}s")
 
 
-def comfyui_get_outputs(prompt_id: str) -> list:
-    """Get output files from completed prompt."""
-    url = f"{COMFYUI_URL}/history/{prompt_id}"
-    resp = urllib.request.urlopen(url, timeout=10)
-    history = json.loads(resp.read())
+# Seconds between /history polls; the last value repeats
+HISTORY_POLL_DELAYS = (0.5, 0.5, 1, 1, 2, 2, 5)
+
 
+def comfyui_wait_http(prompt_id: str, timeout: int = 2400) -> list:
+    """Wait for a queued prompt by polling /history/{prompt_id} (no websocket).
+
+    Returns list of output file infos like comfyui_queue_and_wait.
+    """
+    KEEPALIVE_INTERVAL = 30
+    start = last_keepalive = time.monotonic()
+    deadline = start + timeout
+    polls = 0
+    while (remaining := deadline - time.monotonic()) > 0:
+        time.sleep(min(HISTORY_POLL_DELAYS[min(polls, len(HISTORY_POLL_DELAYS) - 1)], remaining))
+        polls += 1
+
+        history = _json_loads(comfyui_request("GET", f"/history/{prompt_id}", timeout=10))
+        entry = history.get(prompt_id)
+        if entry:
+            status = entry.get("status", {})
+            if status.get("status_str") == "error":
+                error = next((m[1].get("exception_message", "unknown")
+                              for m in status.get("messages", []) if m[0] == "execution_error"), "unknown")
+                raise Exception(f"Execution error: {error}")
+            # History entries are written once the prompt has finished
+            print(f"[ai-media] Execution complete! ({polls} polls)", file=sys.stderr)
+            return _history_outputs(entry)
+
+        # keep-alive output for the Node.js activity timeout
+        now = time.monotonic()
+        if now - last_keepalive >= KEEPALIVE_INTERVAL:
+            print(f"[ai-media] Waiting for ComfyUI... ({(now - start) / 60:.1f}min elapsed)",
+                  file=sys.stderr, flush=True)
+            last_keepalive = now
+
+    raise Exception(f"Timeout after {timeout}s")
+
+
+def _ui_output_files(node_output: dict) -> list:
+    """File infos from one output node's UI result (history entry or `executed` event)."""
+    return node_output.get("gifs", []) + node_output.get("images", []) + node_output.get("videos", [])
+
+
+def _history_outputs(entry: dict) -> list:
     outputs = []
-    if prompt_id in history:
-        for node_id, node_output in history[prompt_id].get("outputs", {}).items():
-            if "gifs" in node_output:
-                outputs.extend(node_output["gifs"])
-            if "images" in node_output:
-                outputs.extend(node_output["images"])
-            if "videos" in node_output:
-                outputs.extend(node_output["videos"])
+    for node_output in entry.get("outputs", {}).values():
+        outputs.extend(_ui_output_files(node_output))
     return outputs
 
 
-def comfyui_download_output(filename: str, subfolder: str = "", folder_type: str = "output") -> str:
-    """Download output file from ComfyUI."""
+def comfyui_get_outputs(prompt_id: str) -> list:
+    """Get output files from completed prompt."""
+    history = _json_loads(comfyui_request("GET", f"/history/{prompt_id}", timeout=10))
+    return _history_outputs(history.get(prompt_id, {}))
+
+
+def comfyui_download_output(filename: str, subfolder: str = "", folder_type: str = "output",
+                            dest: str = None) -> str:
+    """Download output file from ComfyUI to dest (default WORKING_DIR/filename).
+
+    The body is streamed to <dest>.tmp, never held in memory as a whole, and
+    renamed over dest only once complete (a failed download leaves no partial file).
+    """
     params = urllib.parse.urlencode({"filename": filename, "subfolder": subfolder, "type": folder_type})
-    url = f"{COMFYUI_URL}/view?{params}"
+    out_path = dest or os.path.join(WORKING_DIR, filename)
+    tmp_path = out_path + ".tmp"
     try:
-        resp = urllib.request.urlopen(url, timeout=60)
-        out_path = os.path.join(WORKING_DIR, filename)
-        with open(out_path, "wb") as f:
-            f.write(resp.read())
+        with open(tmp_path, "wb") as f:
+            comfyui_request("GET", f"/view?{params}", timeout=60, sink=f)
+        os.replace(tmp_path, out_path)
         return out_path
     except Exception as e:
         print(f"[ai-media] Download failed: {e}", file=sys.stderr)
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
         return None
 
 
@@ -2740,9 +3149,10 @@ def comfyui_download_output(filename: str, subfolder: str = "", folder_type: str
 #   BUG6: fp8 text encoder → GGUF (fp8 crashes on MPS: Float8_e4m3fn unsupported)
 # ===========================================================================
 
-def _unet_loader_node():
-    """UNET model loader node."""
-    if WAN22_USE_GGUF_UNET:
+def _unet_loader_node(precision: str = None):
+    """UNET model loader node. precision: "gguf" / "fp16" (None = WAN22_USE_GGUF_UNET)"""
+    use_gguf = WAN22_USE_GGUF_UNET if precision is None else precision == "gguf"
+    if use_gguf:
         return {
             "class_type": "UnetLoaderGGUF",
             "inputs": {
@@ -2798,29 +3208,17 @@ def _text_encoder_node():
         }
 
 
-def build_wan22_t2v_workflow(prompt: str, width: int = 832, height: int = 480,
-                             num_frames: int = 33, steps: int = 30,
-                             seed: int = None) -> dict:
-    """Build Wan2.2 TI2V-5B text-to-video workflow JSON.
+def _copy_workflow(template: dict) -> dict:
+    """Per-call copy of a cached workflow template. Node and inputs dicts are
+    copied (builders overwrite scalar inputs); link lists are shared, never mutated."""
+    return {k: {"class_type": v["class_type"], "inputs": v["inputs"].copy()} for k, v in template.items()}
 
-    Node graph (numeric IDs only for ComfyUI API compatibility):
-      1   UNETLoader (fp16)
-      2   ModelSamplingSD3 (shift=3.0) ← model from [1]
-      3   CLIPLoaderGGUF (GGUF text encoder)
-      4   VAELoader
-      5   CLIPTextEncode (positive) ← clip from [3]
-      6   Wan22ImageToVideoLatent (no start_image = T2V) ← vae from [4]
-      7   CLIPTextEncode (negative="") ← clip from [3]
-      8   KSampler ← model[2], pos[5], neg[7], latent[6]
-      9   VAEDecode ← samples[8], vae[4]
-      10  VHS_VideoCombine ← images[9]
-    """
-    if seed is None:
-        import random
-        seed = random.randint(0, 2**32 - 1)
 
+@functools.lru_cache(maxsize=None)
+def _wan22_t2v_template(precision: str = None) -> dict:
+    """Static T2V graph (built once per precision); the builder patches per-call fields."""
     return {
-        "1": _unet_loader_node(),
+        "1": _unet_loader_node(precision),
         "2": _model_sampling_node("1"),
         "3": _text_encoder_node(),
         "4": {
@@ -2829,14 +3227,14 @@ def build_wan22_t2v_workflow(prompt: str, width: int = 832, height: int = 480,
         },
         "5": {
             "class_type": "CLIPTextEncode",
-            "inputs": {"text": prompt, "clip": ["3", 0]}
+            "inputs": {"text": "", "clip": ["3", 0]}
         },
         "6": {
             "class_type": "Wan22ImageToVideoLatent",
             "inputs": {
-                "width": width,
-                "height": height,
-                "length": num_frames,
+                "width": 832,
+                "height": 480,
+                "length": 33,
                 "batch_size": 1,
                 "vae": ["4", 0]
             }
@@ -2848,8 +3246,8 @@ def build_wan22_t2v_workflow(prompt: str, width: int = 832, height: int = 480,
         "8": {
             "class_type": "KSampler",
             "inputs": {
-                "seed": seed,
-                "steps": steps,
+                "seed": 0,
+                "steps": 30,
                 "cfg": 3.5,
                 "sampler_name": "euler",
                 "scheduler": "simple",
@@ -2883,35 +3281,11 @@ def build_wan22_t2v_workflow(prompt: str, width: int = 832, height: int = 480,
     }
 
 
-def build_wan22_i2v_workflow(prompt: str, image_name: str, width: int = 832,
-                             height: int = 480, num_frames: int = 33,
-                             steps: int = 30, seed: int = None) -> dict:
-    """Build Wan2.2 TI2V-5B image-to-video workflow JSON.
-
-    Node graph (numeric IDs only for ComfyUI API compatibility):
-      1   UNETLoader (fp16)
-      2   ModelSamplingSD3 (shift=5.0 for I2V) ← model from [1]
-      3   CLIPLoaderGGUF (GGUF text encoder)
-      4   VAELoader
-      5   CLIPTextEncode (positive) ← clip from [3]
-      6   LoadImage (start frame)
-      7   Wan22ImageToVideoLatent (with start_image) ← vae[4], start_image[6]
-      8   CLIPTextEncode (negative="") ← clip from [3]
-      9   KSampler ← model[2], pos[5], neg[8], latent[7]
-      10  VAEDecode ← samples[9], vae[4]
-      11  VHS_VideoCombine ← images[10]
-
-    NOTE: 5B model does NOT use CLIPVision (BUG3 fix).
-    CLIPVisionLoader / CLIPVisionEncode / WanImageToVideoCond are 14B-only.
-    The 5B model takes start_image directly via Wan22ImageToVideoLatent.
-    I2V uses shift=5.0 (vs T2V shift=3.0) for better motion while preserving start_image.
-    """
-    if seed is None:
-        import random
-        seed = random.randint(0, 2**32 - 1)
-
+@functools.lru_cache(maxsize=None)
+def _wan22_i2v_template(precision: str = None) -> dict:
+    """Static I2V graph (built once per precision); the builder patches per-call fields."""
     return {
-        "1": _unet_loader_node(),
+        "1": _unet_loader_node(precision),
         "2": _model_sampling_node("1", shift=WAN22_SHIFT_I2V),
         "3": _text_encoder_node(),
         "4": {
@@ -2920,18 +3294,18 @@ def build_wan22_i2v_workflow(prompt: str, image_name: str, width: int = 832,
         },
         "5": {
             "class_type": "CLIPTextEncode",
-            "inputs": {"text": prompt, "clip": ["3", 0]}
+            "inputs": {"text": "", "clip": ["3", 0]}
         },
         "6": {
             "class_type": "LoadImage",
-            "inputs": {"image": image_name}
+            "inputs": {"image": ""}
         },
         "7": {
             "class_type": "Wan22ImageToVideoLatent",
             "inputs": {
-                "width": width,
-                "height": height,
-                "length": num_frames,
+                "width": 832,
+                "height": 480,
+                "length": 33,
                 "batch_size": 1,
                 "vae": ["4", 0],
                 "start_image": ["6", 0]
@@ -2944,8 +3318,8 @@ def build_wan22_i2v_workflow(prompt: str, image_name: str, width: int = 832,
         "9": {
             "class_type": "KSampler",
             "inputs": {
-                "seed": seed,
-                "steps": steps,
+                "seed": 0,
+                "steps": 30,
                 "cfg": 3.5,
                 "sampler_name": "euler",
                 "scheduler": "simple",
@@ -2979,6 +3353,100 @@ def build_wan22_i2v_workflow(prompt: str, image_name: str, width: int = 832,
     }
 
 
+def _batch_video_workflow(wf: dict, latent_node: str, sampler_node: str, decode_node: str,
+                          combine_node: str, batch: int, num_frames: int) -> dict:
+    """Sample `batch` videos in one KSampler pass and save each as its own file.
+
+    Adds (IDs 20+):
+      20      RepeatLatentBatch ← latent[latent_node]; KSampler samples from it
+      21,23…  ImageFromBatch ← frames of video i from the decoded batch
+      22,24…  VHS_VideoCombine (copy of combine_node) ← images of video i
+    VAEDecode flattens the batch into one image sequence, so it is cut back
+    into per-video slices before encoding.
+    """
+    wf["20"] = {"class_type": "RepeatLatentBatch",
+                "inputs": {"samples": [latent_node, 0], "amount": batch}}
+    wf[sampler_node]["inputs"]["latent_image"] = ["20", 0]
+    frames = (num_frames - 1) // 4 * 4 + 1  # frames per decoded video (4x temporal VAE)
+    combine = wf.pop(combine_node)
+    for i in range(batch):
+        split_id, out_id = str(21 + 2 * i), str(22 + 2 * i)
+        wf[split_id] = {"class_type": "ImageFromBatch",
+                        "inputs": {"image": [decode_node, 0], "batch_index": i * frames, "length": frames}}
+        wf[out_id] = {"class_type": combine["class_type"],
+                      "inputs": {**combine["inputs"], "images": [split_id, 0]}}
+    return wf
+
+
+def build_wan22_t2v_workflow(prompt: str, width: int = 832, height: int = 480,
+                             num_frames: int = 33, steps: int = 30,
+                             seed: int = None, precision: str = None,
+                             batch: int = 1) -> dict:
+    """Build Wan2.2 TI2V-5B text-to-video workflow JSON.
+
+    Node graph (numeric IDs only for ComfyUI API compatibility):
+      1   UnetLoaderGGUF (Q5_K_S) / UNETLoader (fp16)
+      2   ModelSamplingSD3 (shift=3.0) ← model from [1]
+      3   CLIPLoaderGGUF (GGUF text encoder)
+      4   VAELoader
+      5   CLIPTextEncode (positive) ← clip from [3]
+      6   Wan22ImageToVideoLatent (no start_image = T2V) ← vae from [4]
+      7   CLIPTextEncode (negative="") ← clip from [3]
+      8   KSampler ← model[2], pos[5], neg[7], latent[6]
+      9   VAEDecode ← samples[8], vae[4]
+      10  VHS_VideoCombine ← images[9]
+    batch > 1 replaces [10] with per-video outputs (see _batch_video_workflow).
+    """
+    if seed is None:
+        seed = random.getrandbits(32)
+
+    wf = _copy_workflow(_wan22_t2v_template(precision))
+    wf["5"]["inputs"]["text"] = prompt
+    wf["6"]["inputs"].update(width=width, height=height, length=num_frames)
+    wf["8"]["inputs"].update(seed=seed, steps=steps)
+    if batch > 1:
+        _batch_video_workflow(wf, "6", "8", "9", "10", batch, num_frames)
+    return wf
+
+
+def build_wan22_i2v_workflow(prompt: str, image_name: str, width: int = 832,
+                             height: int = 480, num_frames: int = 33,
+                             steps: int = 30, seed: int = None,
+                             precision: str = None, batch: int = 1) -> dict:
+    """Build Wan2.2 TI2V-5B image-to-video workflow JSON.
+
+    Node graph (numeric IDs only for ComfyUI API compatibility):
+      1   UnetLoaderGGUF (Q5_K_S) / UNETLoader (fp16)
+      2   ModelSamplingSD3 (shift=5.0 for I2V) ← model from [1]
+      3   CLIPLoaderGGUF (GGUF text encoder)
+      4   VAELoader
+      5   CLIPTextEncode (positive) ← clip from [3]
+      6   LoadImage (start frame)
+      7   Wan22ImageToVideoLatent (with start_image) ← vae[4], start_image[6]
+      8   CLIPTextEncode (negative="") ← clip from [3]
+      9   KSampler ← model[2], pos[5], neg[8], latent[7]
+      10  VAEDecode ← samples[9], vae[4]
+      11  VHS_VideoCombine ← images[10]
+    batch > 1 replaces [11] with per-video outputs (see _batch_video_workflow).
+
+    NOTE: 5B model does NOT use CLIPVision (BUG3 fix).
+    CLIPVisionLoader / CLIPVisionEncode / WanImageToVideoCond are 14B-only.
+    The 5B model takes start_image directly via Wan22ImageToVideoLatent.
+    I2V uses shift=5.0 (vs T2V shift=3.0) for better motion while preserving start_image.
+    """
+    if seed is None:
+        seed = random.getrandbits(32)
+
+    wf = _copy_workflow(_wan22_i2v_template(precision))
+    wf["5"]["inputs"]["text"] = prompt
+    wf["6"]["inputs"]["image"] = image_name
+    wf["7"]["inputs"].update(width=width, height=height, length=num_frames)
+    wf["9"]["inputs"].update(seed=seed, steps=steps)
+    if batch > 1:
+        _batch_video_workflow(wf, "7", "9", "10", "11", batch, num_frames)
+    return wf
+
+
 # ===========================================================================
 # Utility
 # ===========================================================================
@@ -2991,19 +3459,18 @@ def find_output_file(expected_path: str, workdir: str) -> str:
     if not os.path.isdir(d):
         d = workdir
 
-    candidates = []
-    for f in os.listdir(d):
-        fpath = os.path.join(d, f)
-        if os.path.isfile(fpath) and f.endswith((".png", ".jpg", ".jpeg")):
-            mtime = os.path.getmtime(fpath)
-            if time.time() - mtime < 600:
-                candidates.append((mtime, fpath))
+    # Newest image written in the last 10 minutes (scandir entries carry the stat)
+    now = time.time()
+    best_mtime, best_path = 0, None
+    with os.scandir(d) as it:
+        for entry in it:
+            if not entry.name.endswith((".png", ".jpg", ".jpeg")) or not entry.is_file():
+                continue
+            mtime = entry.stat().st_mtime
+            if now - mtime < 600 and mtime > best_mtime:
+                best_mtime, best_path = mtime, entry.path
 
-    if candidates:
-        candidates.sort(reverse=True)
-        return candidates[0][1]
-
-    return expected_path
+    return best_path or expected_path
 
 
 # ===========================================================================
@@ -3020,7 +3487,8 @@ def main():
     p_gen.add_argument("--width", type=int, default=1024)
     p_gen.add_argument("--height", type=int, default=1024)
     p_gen.add_argument("--steps", type=int, default=9)
-    p_gen.add_argument("--quantize", type=int, default=8)
+    p_gen.add_argument("--quantize", type=int, choices=[3, 4, 5, 6, 8], default=None,
+                       help="Weight bits (default 8, or 4 with Z_IMAGE_Q4=1)")
     p_gen.add_argument("--seed", type=int, default=None)
 
     # edit
@@ -3088,6 +3556,10 @@ def main():
                          help="Frames (33=~1.4s, 81=~3.4s, 121=~5s, 240=~10s at 24fps)")
     p_anim.add_argument("--steps", type=int, default=30)
     p_anim.add_argument("--seed", type=int, default=None)
+    p_anim.add_argument("--batch", type=int, default=1,
+                         help="Videos per run, sampled together (max 4 up to 768x768, else 2)")
+    p_anim.add_argument("--precision", choices=["gguf", "fp16"], default=None,
+                         help="UNET weights: gguf (Q5_K_S, default, ~2x faster on MPS) or fp16 (full quality, ~10GB)")
 
     # undress — dedicated nude generation with pre-optimized params
     p_undress = sub.add_parser("undress", help="Undress editing (FLUX.1 Dev + LoRA, optimized for nudity)")
@@ -3116,31 +3588,58 @@ def main():
     # status
     sub.add_parser("status", help="Check system status")
 
+    if os.environ.get("AI_MEDIA_DAEMON") == "1":
+        serve_stdin(parser)
+        return
+
     args = parser.parse_args()
+    print(json.dumps(run_command(args), ensure_ascii=False))
+
 
+def run_command(args) -> dict:
     if args.command == "status":
-        result = check_status()
+        return check_status()
     elif args.command == "generate":
-        result = cmd_generate(args)
+        return cmd_generate(args)
     elif args.command == "edit":
-        result = cmd_edit(args)
+        return cmd_edit(args)
     elif args.command == "outpaint":
-        result = cmd_outpaint(args)
+        return cmd_outpaint(args)
     elif args.command == "animate":
-        result = cmd_animate(args)
+        return cmd_animate(args)
     elif args.command == "undress":
-        result = cmd_undress(args)
+        return cmd_undress(args)
 
-    print(json.dumps(result, ensure_ascii=False))
+
+def serve_stdin(parser):
+    """Daemon mode: one JSON request per stdin line → one JSON result per stdout line."""
+    print(f"[ai-media] Daemon mode (clientId={_COMFYUI_CLIENT_ID})", file=sys.stderr, flush=True)
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            # stdout carries only the JSON results: send argparse's -h/--help
+            # text there to stderr too (usage errors already go to stderr)
+            with contextlib.redirect_stdout(sys.stderr):
+                args = parser.parse_args(_json_loads(line)["argv"])
+            result = run_command(args)
+        except SystemExit:
+            result = {"ok": False, "error": "invalid arguments"}
+        except Exception as e:
+            result = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        print(json.dumps(result, ensure_ascii=False), flush=True)
 
 
 def check_status():
     """Check what's available."""
+    # Re-list model dirs every call: the daemon outlives downloads/deletions
+    _model_dir_files.cache_clear()
     status = {
         "mflux_installed": False,
         "comfyui_running": False,
         "mflux_venv": os.path.exists(MFLUX_VENV),
         "comfyui_dir": os.path.exists(COMFYUI_DIR),
+        "zimage_quantize": Z_IMAGE_DEFAULT_QUANTIZE,
         "wan22_config": {
             "text_encoder": WAN22_TEXT_ENCODER_TYPE,
             "unet": "gguf" if WAN22_USE_GGUF_UNET else "fp16",
@@ -3159,12 +3658,12 @@ def check_status():
     status["comfyui_running"] = comfyui_is_running()
 
     # Check model files
-    models_dir = os.path.join(COMFYUI_DIR, "models")
     status["models"] = {
-        "unet_fp16": os.path.exists(os.path.join(models_dir, "diffusion_models", WAN22_MODEL)),
-        "text_encoder_gguf": os.path.exists(os.path.join(models_dir, "text_encoders", WAN22_CLIP_GGUF)),
-        "text_encoder_fp16": os.path.exists(os.path.join(models_dir, "text_encoders", WAN22_CLIP_FP16)),
-        "vae": os.path.exists(os.path.join(models_dir, "vae", WAN22_VAE)),
+        "unet_fp16": _model_path("diffusion_models", WAN22_MODEL) is not None,
+        "unet_gguf": _model_path("unet", WAN22_GGUF_UNET_MODEL) is not None,
+        "text_encoder_gguf": _model_path("text_encoders", WAN22_CLIP_GGUF) is not None,
+        "text_encoder_fp16": _model_path("text_encoders", WAN22_CLIP_FP16) is not None,
+        "vae": _model_path("vae", WAN22_VAE) is not None,
     }
 
     return status
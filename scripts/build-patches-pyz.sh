@@ -0,0 +1,23 @@
+#!/bin/bash
+# build-patches-pyz.sh — Bundle the root patch scripts into a single zipapp
+# Bytecode is compiled ahead of time (legacy .pyc next to each .py) so
+# zipimport loads it directly instead of re-parsing the sources on every run.
+# Usage: bash scripts/build-patches-pyz.sh [output]   (default: patches.pyz)
+#        python3 patches.pyz apply-patches-v3
+set -euo pipefail
+
+cd "$(dirname "$0")/.." || exit 1
+
+OUT="${1:-patches.pyz}"
+STAGE=$(mktemp -d)
+trap 'rm -rf "$STAGE"' EXIT
+
+cp patch_dispatch.py patch_utils.py \
+   apply-patches.py apply-patches-v2.py apply-patches-v3.py \
+   fix-router-v4.py deploy-media.py patch-index.py inject-context.py \
+   "$STAGE/"
+
+python3 -m compileall -q -b "$STAGE"
+python3 -m zipapp "$STAGE" -o "$OUT" -m "patch_dispatch:main" -p "/usr/bin/env python3" -c
+
+echo "Built $OUT"
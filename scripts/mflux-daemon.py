@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+mflux-daemon.py — keeps Z-Image-Turbo loaded between `ai-media.py generate` calls
+===============================================================================
+Each `mflux-generate-z-image-turbo` run pays for Python + MLX import and weight
+loading before a 4-9 step inference. This daemon imports mflux once, keeps the
+last loaded model in memory and serves generations over a Unix socket.
+
+Requires mflux >= 0.21.0, the first release whose z_image_turbo_generate
+module exposes ZImageTurboCommand / build_parser; older installs exit at startup
+and ai-media.py falls back to the CLI.
+
+Started lazily by ai-media.py when MFLUX_USE_DAEMON=1 (run with the mflux venv
+python). Exits after
+MFLUX_DAEMON_IDLE seconds without requests so the weights don't compete with
+ComfyUI for unified memory.
+
+Protocol (one request per connection, newline-terminated JSON):
+  → {"argv": ["--prompt", "...", "--output", "/tmp/x.png", ...]}
+    (same arguments as mflux-generate-z-image-turbo)
+  ← {"ok": true} | {"ok": false, "error": "..."}
+"""
+
+import json
+import os
+import random
+import re
+import socket
+import socketserver
+import sys
+import traceback
+from importlib.metadata import version
+
+MIN_MFLUX_VERSION = (0, 21, 0)
+
+_mflux_version = version("mflux")
+if tuple(map(int, re.findall(r"\d+", _mflux_version)[:3])) < MIN_MFLUX_VERSION:
+    sys.exit(f"[mflux-daemon] mflux {_mflux_version} is too old "
+             f"(need >= {'.'.join(map(str, MIN_MFLUX_VERSION))}), use the CLI")
+
+from mflux.models.z_image.cli.z_image_turbo_generate import ZImageTurboCommand, build_parser
+from mflux.utils.prompt_util import PromptUtil
+
+SOCKET_PATH = os.environ.get("MFLUX_SOCKET", "/tmp/mflux.sock")
+IDLE_TIMEOUT = int(os.environ.get("MFLUX_DAEMON_IDLE", "600"))
+
+# Per-image arguments; everything else decides which weights get loaded
+_PER_IMAGE_ARGS = {
+    "prompt", "prompt_file", "output", "seed", "auto_seeds", "width", "height", "steps",
+    "image_path", "image_strength", "metadata", "guidance", "negative_prompt",
+}
+
+_parser = build_parser()
+_model = None
+_model_key = None
+
+
+def generate(argv: list) -> None:
+    """Parse CLI-style argv, reuse the loaded model when the load args match."""
+    global _model, _model_key
+    args = _parser.parse_args(argv)
+    key = repr(sorted((k, v) for k, v in vars(args).items() if k not in _PER_IMAGE_ARGS))
+    if _model is None or key != _model_key:
+        _model = None  # drop the old weights before loading new ones
+        _model = ZImageTurboCommand.load(args)
+        _model_key = key
+    # mflux's parser fills in a time-based seed, but don't rely on it
+    seeds = args.seed if args.seed is not None else [random.getrandbits(32)]
+    for seed in seeds:
+        image = ZImageTurboCommand.generate(_model, args, seed, PromptUtil.read_prompt(args))
+        image.save(path=args.output.format(seed=seed), export_json_metadata=args.metadata)
+
+
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            generate(request["argv"])
+            response = {"ok": True}
+        except SystemExit:
+            response = {"ok": False, "error": "invalid arguments"}
+        except Exception as e:
+            traceback.print_exc()
+            response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class Server(socketserver.UnixStreamServer):
+    timeout = IDLE_TIMEOUT
+
+    def handle_timeout(self):
+        print(f"[mflux-daemon] Idle for {IDLE_TIMEOUT}s, exiting", file=sys.stderr, flush=True)
+        raise SystemExit(0)
+
+
+def main():
+    # Another daemon already listening → nothing to do
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            probe.connect(SOCKET_PATH)
+        return
+    except OSError:
+        pass
+    try:
+        os.unlink(SOCKET_PATH)
+    except FileNotFoundError:
+        pass
+
+    with Server(SOCKET_PATH, Handler) as server:
+        os.chmod(SOCKET_PATH, 0o600)
+        print(f"[mflux-daemon] Listening on {SOCKET_PATH}", file=sys.stderr, flush=True)
+        try:
+            while True:
+                server.handle_request()
+        finally:
+            os.unlink(SOCKET_PATH)
+
+
+if __name__ == "__main__":
+    main()